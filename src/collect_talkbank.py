@@ -0,0 +1,84 @@
+"""
+Consolidate the predictions of every engine with the TalkBank metadata
+
+    python -m src.collect_talkbank --type segment # Produces talkbank_df_segments.parquet
+    python -m src.collect_talkbank --type switch # Produces talkbank_df_switch.parquet
+"""
+import argparse
+
+import pandas as pd
+
+from src.dataset_utils import get_talkbank_metadata
+from src.prediction_store import load_texts
+
+# prediction store of each engine -> column of the collected table
+ENGINE_COLUMNS = {
+    "Whisper": "whisper",
+    "Wav2vec2Multi": "wav2vec2-large-960h",
+    "Canary": "canary",
+    "Wav2vec2": "wav2vec256",
+}
+
+# dataset column -> column of the collected table
+METADATA_COLUMNS = {
+    "transcript": "transcription",
+    "language_code": "language",
+    "subset": "subset",
+    "full_language": "full_language",
+    "switch_id": "switch_id",
+    "segment_id": "segment_id",
+    "transcript_filename": "transcript_filename",
+    "audio_len_sec": "audio_len_sec",
+    "orig_file_start": "orig_file_start",
+    "orig_file_end": "orig_file_end",
+    "channel": "channel",
+}
+
+OUTPUT_NAMES = {
+    "segment": "talkbank_df_segments",
+    "switch": "talkbank_df_switch",
+}
+
+
+def collect_talkbank(dataset_type='segment',
+                     languages=('en', 'zh', 'ja', 'de', 'fr', 'es'),
+                     output_dir='predictions'):
+    """
+    Metadata of every language, with one column per engine holding its prediction (null if missing)
+    Return:
+        df (pd.DataFrame)
+    """
+    id_key = f"{dataset_type}_id"
+
+    df = pd.concat([
+        get_talkbank_metadata(lang_code, dataset_type)
+        for lang_code in languages
+    ], ignore_index=True)
+    df = df[list(METADATA_COLUMNS)].rename(columns=METADATA_COLUMNS)
+    df.insert(0, 'file', df[id_key] + 'mp3')
+
+    for engine_name, column in ENGINE_COLUMNS.items():
+        texts = pd.Series(load_texts(output_dir, engine_name), dtype=object)
+        df[column] = df[id_key].map(texts)
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--type", default="segment", choices=["segment", "switch"],
+                        help="TalkBank dataset type")
+    parser.add_argument("--langs", default="en,zh,ja,de,fr,es",
+                        help="comma separated lang codes")
+    parser.add_argument("--output-dir", default="predictions",
+                        help="directory of the prediction stores")
+    parser.add_argument("--format", default="parquet", choices=["parquet", "csv"])
+    args = parser.parse_args()
+
+    df = collect_talkbank(args.type, args.langs.split(","), args.output_dir)
+    path = f"{OUTPUT_NAMES[args.type]}.{args.format}"
+    if args.format == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    print(f"Saved {len(df)} rows into {path}")
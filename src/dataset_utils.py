@@ -1,9 +1,15 @@
+import io
 import os
-import uuid
 
-import librosa
+import numpy as np
+import soundfile as sf
+import soxr
 from datasets import concatenate_datasets, load_dataset
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, Sampler
+from tqdm import tqdm
+
+SAMPLING_RATE = 16000
+INT16_SCALE = 32767
 
 
 def get_talkbank_dataset(language='en', dataset_type='segment'):
@@ -14,23 +20,237 @@ def get_talkbank_dataset(language='en', dataset_type='segment'):
     return concatenate_datasets([dataset_train, dataset_test])
 
 
+def get_talkbank_metadata(language='en', dataset_type='segment'):
+    """
+    Every column of the split but the audio, as a pd.DataFrame
+    (no audio bytes are read nor decoded)
+    """
+    dataset = get_talkbank_dataset(language=language, dataset_type=dataset_type)
+    return dataset.remove_columns(['audio']).to_pandas()
+
+
+def decode_audio(data, sampling_rate=SAMPLING_RATE):
+    """
+    Decode an audio file held in memory, without going through the filesystem
+    Params:
+        data (bytes): encoded audio (mp3, wav, flac...)
+        sampling_rate (int): sampling rate of the returned waveform
+    Return:
+        audio (np.ndarray): mono float32 waveform
+    """
+    audio, sr = sf.read(io.BytesIO(data), dtype='float32', always_2d=True)
+    audio = audio.mean(axis=1)
+    if sr != sampling_rate:
+        # same resampler as librosa.load default (res_type="soxr_hq")
+        audio = soxr.resample(audio, sr, sampling_rate, quality='HQ')
+    return audio
+
+
+def get_audio_cache_paths(cache_dir, language, dataset_type, dtype='float32'):
+    """
+    Return:
+        audio_path (str): flat array of all the samples of the split
+        offsets_path (str): sample i is audio[offsets[i]:offsets[i + 1]]
+    """
+    prefix = os.path.join(cache_dir, f"{language}_{dataset_type}")
+    return f"{prefix}.{dtype}.bin", f"{prefix}.{dtype}.offsets.npy"
+
+
+def materialize_talkbank_audio(language,
+                               dataset_type='segment',
+                               cache_dir='audio_cache',
+                               dtype='float32',
+                               dataset=None,
+                               overwrite=False):
+    """
+    Decode a whole language/split once and store it as 16 kHz mono samples
+    in one flat file that TalkbankDataset can memory-map
+    Params:
+        dtype (str): 'float32' or 'int16' (half the disk, quantized to 16 bits)
+        dataset (datasets.Dataset): already loaded split, loaded if None
+    Return:
+        audio_path (str), offsets_path (str)
+    """
+    assert dtype in ['float32', 'int16'], f"unsupported cache dtype {dtype}"
+    audio_path, offsets_path = get_audio_cache_paths(cache_dir, language,
+                                                     dataset_type, dtype)
+    if not overwrite and os.path.isfile(offsets_path):
+        return audio_path, offsets_path
+
+    if dataset is None:
+        dataset = get_talkbank_dataset(language=language,
+                                       dataset_type=dataset_type)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    offsets = np.zeros(len(dataset) + 1, dtype=np.int64)
+    with open(audio_path + '.tmp', 'wb') as f:
+        samples = dataset.select_columns(['audio'])
+        for i, sample in enumerate(
+                tqdm(samples, desc=f"Caching {language}_{dataset_type}")):
+            audio = decode_audio(sample['audio']['bytes'])
+            if dtype == 'int16':
+                audio = np.round(np.clip(audio, -1, 1) * INT16_SCALE)
+            f.write(audio.astype(dtype).tobytes())
+            offsets[i + 1] = offsets[i] + len(audio)
+    os.replace(audio_path + '.tmp', audio_path)
+
+    # the offsets are written last, their presence marks a complete cache
+    with open(offsets_path + '.tmp', 'wb') as f:
+        np.save(f, offsets)
+    os.replace(offsets_path + '.tmp', offsets_path)
+    return audio_path, offsets_path
+
+
+class AudioCache(object):
+    """
+    Read side of materialize_talkbank_audio. The memmap is opened lazily so
+    that the object can be sent to DataLoader workers without its content.
+    """
+
+    def __init__(self, audio_path, offsets_path, dtype='float32'):
+        self.audio_path = audio_path
+        self.offsets_path = offsets_path
+        self.dtype = dtype
+        self.offsets = np.load(offsets_path)
+        self._audio = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        if self._audio is None:
+            # copy-on-write: slices are writable views, the file is never modified
+            self._audio = np.memmap(self.audio_path, dtype=self.dtype, mode='c')
+        audio = self._audio[self.offsets[idx]:self.offsets[idx + 1]]
+        if self.dtype == 'int16':
+            audio = audio.astype(np.float32) / INT16_SCALE
+        return audio
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_audio'] = None
+        return state
+
+
 class TalkbankDataset(Dataset):
 
-    def __init__(self, language, dataset_type='segment'):
+    def __init__(self,
+                 language,
+                 dataset_type='segment',
+                 cache_dir=None,
+                 cache_dtype='float32'):
+        """
+        Params:
+            cache_dir (str): if set, audio is served from the memory-mapped cache
+                of materialize_talkbank_audio (built on first use)
+            cache_dtype (str): 'float32' or 'int16'
+        """
         self.dataset = get_talkbank_dataset(language=language,
                                             dataset_type=dataset_type)
+        self.audio_cache = None
+        if cache_dir is not None:
+            paths = materialize_talkbank_audio(language,
+                                               dataset_type,
+                                               cache_dir=cache_dir,
+                                               dtype=cache_dtype,
+                                               dataset=self.dataset)
+            self.audio_cache = AudioCache(*paths, dtype=cache_dtype)
+            assert len(self.audio_cache) == len(self.dataset), \
+                f"audio cache {paths[0]} does not match the dataset"
+            # metadata only, the mp3 bytes are not even read anymore
+            self.dataset = self.dataset.remove_columns(['audio'])
 
     def __len__(self):
         return len(self.dataset)
 
+    def ids(self, id_key='segment_id'):
+        """
+        Return:
+            ids (list str): segment_id or switch_id of every sample, read from metadata only
+        """
+        return self.dataset[id_key]
+
+    def durations(self):
+        """
+        Return:
+            durations (list float): audio_len_sec of every sample, read from metadata only
+        """
+        return self.dataset['audio_len_sec']
+
     def __getitem__(self, idx):
-        sample = self.dataset[idx].copy()
-        path = str(uuid.uuid4()) + '.mp3'
+        # rows are returned as new dicts, no need to copy before popping
+        sample = self.dataset[idx]
+        if self.audio_cache is not None:
+            return self.audio_cache[idx], sample
 
-        with open(path, 'wb') as f:
-            f.write(sample['audio']['bytes'])
-        audio, _ = librosa.load(path, sr=16000, mono=True)
-        os.remove(path)
-        del sample['audio']
+        audio = decode_audio(sample.pop('audio')['bytes'])
 
         return audio, sample
+
+
+class DurationBucketSampler(Sampler):
+    """
+    Batch sampler grouping samples of similar duration, so that batched engines
+    spend little compute on padding. Batches are filled longest samples first
+    while their padded length (batch size * longest sample) stays under
+    max_batch_seconds. A sample longer than the budget gets a batch of its own.
+    Batches are not in dataset order, results must be keyed by sample id.
+    """
+
+    def __init__(self,
+                 durations,
+                 max_batch_seconds=120,
+                 max_batch_size=None,
+                 indices=None,
+                 shuffle=False,
+                 seed=0):
+        """
+        Params:
+            durations (list float): duration in seconds of every sample of the dataset
+            max_batch_seconds (float): padded duration budget of a batch
+            max_batch_size (int): optional cap on the number of samples per batch
+            indices (list int): only batch these dataset indices, defaults to all
+            shuffle (bool): shuffle the order of the batches (not their content)
+        """
+        self.durations = np.asarray(durations, dtype=np.float64)
+        if indices is None:
+            indices = np.arange(len(self.durations))
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.max_batch_seconds = max_batch_seconds
+        self.max_batch_size = max_batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.batches = self._make_batches()
+
+    def _make_batches(self):
+        order = np.argsort(-self.durations[self.indices], kind='stable')
+        batches = []
+        batch, longest = [], 0.
+        for idx in self.indices[order].tolist():
+            full = self.max_batch_size is not None and len(batch) >= self.max_batch_size
+            if batch and (full or (len(batch) + 1) * longest > self.max_batch_seconds):
+                batches.append(batch)
+                batch = []
+            if not batch:
+                longest = self.durations[idx]
+            batch.append(idx)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def __iter__(self):
+        if not self.shuffle:
+            return iter(self.batches)
+        order = np.random.default_rng(self.seed).permutation(len(self.batches))
+        return iter([self.batches[i] for i in order])
+
+    def __len__(self):
+        return len(self.batches)
+
+
+if __name__ == '__main__':
+    available_languages = ['en', 'zh', 'ja', 'de', 'fr', 'es']
+
+    for lang_code in available_languages:
+        for dataset_type in ['segment', 'switch']:
+            materialize_talkbank_audio(lang_code, dataset_type)
@@ -2,7 +2,6 @@ import os
 import librosa
 import torch
 from transformers import Wav2Vec2Processor, Wav2Vec2ForCTC
-import json
 import whisper
 from nemo.collections.asr.models import EncDecMultiTaskModel
 
@@ -20,146 +19,236 @@ class Engine(object):
         elif engine == "Wav2vec2Multi":
             return Wav2vec2MultilingualEngine(**kwargs)
         else:
-            ValueError("cannot create engine of type", engine)
+            raise ValueError(f"cannot create engine of type {engine}")
 
 
-class WhisperEngine(object):
+class BaseEngine(object):
+    """
+    Contract shared by every engine returned by Engine.create.
+    Subclasses implement process_batch, process is a batch of one.
+    """
+    sampling_rate = 16000
 
-    def __init__(self, whisper_size="large-v3", device="cuda"):
+    def process(self, audio, language=None):
+        """
+        Transcribe one segment
+        :param audio: path for file or 16 kHz mono waveform (numpy array or torch tensor)
+        :param language: lang code
+        :return: transcription
+        """
+        return self.process_batch([audio], language)[0]
+
+    def process_batch(self, audios, languages=None):
+        """
+        Transcribe many segments in one call
+        :param audios: list of paths or 16 kHz mono waveforms (numpy arrays or torch tensors)
+        :param languages: lang code, or list of lang codes (one per audio)
+        :return: list of transcriptions, in the same order as audios
+        """
+        raise NotImplementedError
+
+    def _load_audio(self, audio):
+        if isinstance(audio, torch.Tensor):
+            return audio.cpu().numpy()
+        if isinstance(audio, str) and os.path.isfile(audio):
+            audio, sr = librosa.load(audio, sr=self.sampling_rate)
+            assert sr == self.sampling_rate
+        return audio
+
+    @staticmethod
+    def _broadcast_languages(languages, n):
+        if languages is None or isinstance(languages, str):
+            return [languages] * n
+        assert len(languages) == n, "one language per audio is expected"
+        return list(languages)
+
+
+class WhisperEngine(BaseEngine):
+    # defaults of whisper.transcribe, past them it decodes again at a higher temperature
+    compression_ratio_threshold = 2.4
+    logprob_threshold = -1.0
+
+    def __init__(self, whisper_size="large-v3", device="cuda", fp16=True):
         """
 		Args references:
 			https://github.com/openai/whisper/blob/main/whisper/__init__.py#L99 # load_model
 			https://github.com/openai/whisper/blob/main/whisper/decoding.py#L81 # transcribe_args
 			https://github.com/openai/whisper/blob/main/whisper/transcribe.py#L38 # transcribe
+		Params:
+			fp16: half precision inference, whisper's default (ignored on cpu)
 		"""
         self.model = whisper.load_model(whisper_size).to(device)
+        self.fp16 = fp16 and self.model.device.type != "cpu"
 
-    def process(self, audio_file, language=None):
+    def process(self, audio, language=None):
         """
-        Transcribe file
+        Transcribe file or waveform
         :param language: lang code
-        :param audio_file: path for file
+        :param audio: path for file or 16 kHz mono waveform (numpy array or torch tensor)
         :return: transcription
         """
-        result = self.model.transcribe(audio_file, language=language)
+        result = self.model.transcribe(audio,
+                                       language=language,
+                                       fp16=self.fp16)
         return result['text']
 
+    def process_batch(self, audios, languages=None):
+        """
+        Decode every segment shorter than 30s in a single forward pass per language.
+        Longer segments need the sliding window of transcribe and go through process.
+        Batched decoding is greedy: the segments whose result would trigger the
+        temperature fallback of transcribe (compression ratio or average logprob
+        past its thresholds) are decoded again by process, as transcribe does.
+        """
+        languages = self._broadcast_languages(languages, len(audios))
+        transcriptions = [None] * len(audios)
+
+        batches = {}
+        for i, audio in enumerate(audios):
+            audio = self._load_audio(audio)
+            if len(audio) > whisper.audio.N_SAMPLES:
+                transcriptions[i] = self.process(audio, languages[i])
+            else:
+                batches.setdefault(languages[i], []).append((i, audio))
+
+        options = {"fp16": self.fp16}
+        for language, batch in batches.items():
+            mel = torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(audio),
+                                            n_mels=self.model.dims.n_mels,
+                                            device=self.model.device)
+                for _, audio in batch
+            ])
+            results = whisper.decode(
+                self.model, mel,
+                whisper.DecodingOptions(language=language, **options))
+            for (i, audio), result in zip(batch, results):
+                if (result.compression_ratio > self.compression_ratio_threshold
+                        or result.avg_logprob < self.logprob_threshold):
+                    transcriptions[i] = self.process(audio, language)
+                else:
+                    transcriptions[i] = result.text
+        return transcriptions
+
     def __str__(self):
         return 'WHISPER'
 
 
-class Wav2vec2Engine(object):
+class Wav2vec2Engine(BaseEngine):
 
-    def __init__(self, size="large", device="cuda"):
+    def __init__(self, size="large", device="cuda", fp16=False):
         """
 		https://huggingface.co/facebook/wav2vec2-base-960h
 		Params:
 			size: large - base
+			fp16: half precision inference
 		"""
+        self._load_model(f"facebook/wav2vec2-{size}-960h", device, fp16)
+
+    def _load_model(self, name, device, fp16):
         self.device = device
-        self.processor = Wav2Vec2Processor.from_pretrained(
-            f"facebook/wav2vec2-{size}-960h")
-        self.model = Wav2Vec2ForCTC.from_pretrained(
-            f"facebook/wav2vec2-{size}-960h")
+        self.processor = Wav2Vec2Processor.from_pretrained(name)
+        self.model = Wav2Vec2ForCTC.from_pretrained(name)
         self.model.to(self.device)
-
-    def _process_seg(self, audio):
-        input_values = self.processor(audio,
-                                      return_tensors="pt",
-                                      padding="longest",
-                                      sampling_rate=16000).input_values
+        if fp16:
+            self.model.half()
+
+    def process_batch(self, audios, languages=None):
+        audios = [self._load_audio(audio) for audio in audios]
+        if self.processor.feature_extractor.return_attention_mask:
+            return self._process_padded(audios)
+
+        # Without attention_mask (facebook/wav2vec2-*-960h), the feature extractor
+        # normalizes each row with its zero padding and the group norm of the model
+        # runs over the padding too, the transcription of a segment would depend on
+        # its batch: only waveforms of the same length are decoded together
+        transcriptions = [None] * len(audios)
+        same_length = {}
+        for i, audio in enumerate(audios):
+            same_length.setdefault(len(audio), []).append(i)
+        for indices in same_length.values():
+            results = self._process_padded([audios[i] for i in indices])
+            for i, transcription in zip(indices, results):
+                transcriptions[i] = transcription
+        return transcriptions
+
+    def _process_padded(self, audios):
+        """
+        One forward pass over the waveforms zero padded to the longest one
+        """
+        inputs = self.processor(audios,
+                                return_tensors="pt",
+                                padding="longest",
+                                sampling_rate=self.sampling_rate)
         with torch.no_grad():
-            input_values = input_values.to(self.device)
-            logits = self.model(input_values).logits
+            inputs = inputs.to(self.device)
+            inputs["input_values"] = inputs["input_values"].to(self.model.dtype)
+            logits = self.model(**inputs).logits
         predicted_ids = torch.argmax(logits, dim=-1)
-        transcription = self.processor.batch_decode(predicted_ids)[0]
-        return transcription
-
-    def process(self, audio):
-        if isinstance(audio, str) and os.path.isfile(audio):
-            audio, sr = librosa.load(audio, sr=16000)
-            assert sr == 16000
-        return self._process_seg(audio)
+        return self.processor.batch_decode(predicted_ids)
 
     def __str__(self):
         return 'Wav2vec2'
 
 
-class Wav2vec2MultilingualEngine(object):
+class Wav2vec2MultilingualEngine(Wav2vec2Engine):
 
-    def __init__(self, device="cuda"):
+    def __init__(self, device="cuda", fp16=False):
         """
-		https://huggingface.co/facebook/wav2vec2-base-960h
+		https://huggingface.co/voidful/wav2vec2-xlsr-multilingual-56
 		Params:
-			size: large - base
+			fp16: half precision inference
 		"""
-        self.device = device
-        self.processor = Wav2Vec2Processor.from_pretrained(
-            f"voidful/wav2vec2-xlsr-multilingual-56")
-        self.model = Wav2Vec2ForCTC.from_pretrained(
-            f"voidful/wav2vec2-xlsr-multilingual-56")
-        self.model.to(self.device)
+        self._load_model("voidful/wav2vec2-xlsr-multilingual-56", device, fp16)
 
-    def _process_seg(self, audio):
-        input_values = self.processor(audio,
-                                      return_tensors="pt",
-                                      padding="longest",
-                                      sampling_rate=16000).input_values
-        with torch.no_grad():
-            input_values = input_values.to(self.device)
-            logits = self.model(input_values).logits
-        predicted_ids = torch.argmax(logits, dim=-1)
-        transcription = self.processor.batch_decode(predicted_ids)[0]
-        return transcription
-
-    def process(self, audio):
-        if isinstance(audio, str) and os.path.isfile(audio):
-            audio, sr = librosa.load(audio, sr=16000)
-            assert sr == 16000
-        return self._process_seg(audio)
-
-    def __str__(self):
-        return 'Wav2vec2'
 
-
-class CanaryEngine(object):
+class CanaryEngine(BaseEngine):
 
     def __init__(self,
                  batch_size=1,
                  language="en",
                  beam_size=1,
                  device="cuda",
+                 fp16=False,
                  **kwargs):
         """
 		https://huggingface.co/nvidia/canary-1b
+		Params:
+			fp16: run the forward passes under float16 autocast (cuda only)
 		"""
         # load model
         self.model = EncDecMultiTaskModel.from_pretrained('nvidia/canary-1b')
         self.model.to(device)
+        self.fp16 = fp16 and self.model.device.type == "cuda"
         decode_cfg = self.model.cfg.decoding
         decode_cfg.beam.beam_size = beam_size
         self.model.change_decoding_strategy(decode_cfg)
         self.batch_size = batch_size
 
-    def process(self, audio_path, language=None):
-        manifest = {
-            "audio_filepath": audio_path,  # path to the audio file
-            "duration":
-            100,  # duration of the audio, can be set to `None` if using NeMo main branch
-            "taskname":
-            "asr",  # use "s2t_translation" for speech-to-text translation with r1.23, or "ast" if using the NeMo main branch
-            "source_lang":
-            language,  # language of the audio input, set `source_lang`==`target_lang` for ASR, choices=['en','de','es','fr']
-            "target_lang":
-            language,  # language of the text output, choices=['en','de','es','fr']
-            "pnc": "yes",  # whether to have PnC output, choices=['yes', 'no']
-            "answer": "na",
-        }
-        with open('input_manifest.json', 'w') as f:
-            f.write(json.dumps(manifest))
-        predicted_text = self.model.transcribe('input_manifest.json',
-                                               self.batch_size)
-        return predicted_text[0]
+    def process_batch(self, audios, languages=None):
+        """
+        Waveforms are handed to NeMo in memory, the prompt is built from the
+        language of each sub-batch instead of a manifest written to disk.
+        """
+        languages = self._broadcast_languages(languages, len(audios))
+        batches = {}
+        for i, language in enumerate(languages):
+            batches.setdefault(language, []).append(i)
+
+        transcriptions = [None] * len(audios)
+        for language, indexes in batches.items():
+            with torch.autocast("cuda", dtype=torch.float16, enabled=self.fp16):
+                predicted_text = self.model.transcribe(
+                    [self._load_audio(audios[i]) for i in indexes],
+                    batch_size=max(self.batch_size, len(indexes)),
+                    task="asr",
+                    source_lang=language,  # set `source_lang`==`target_lang` for ASR, choices=['en','de','es','fr']
+                    target_lang=language,
+                    pnc="yes",  # whether to have PnC output, choices=['yes', 'no']
+                    verbose=False)
+            for i, t in zip(indexes, predicted_text):
+                transcriptions[i] = getattr(t, 'text', t)
+        return transcriptions
 
     def __str__(self):
         return 'Canary'
@@ -0,0 +1,84 @@
+"""
+Transcribe the TalkBank dataset with one engine
+
+    python -m src.predict --engine Whisper --type segment --langs en,fr --batch-size 16 --workers 8
+"""
+import argparse
+
+from src.engines import Engine
+from src.dataset_utils import TalkbankDataset
+from src.runner import run_prediction
+
+ENGINE_CONFIGS = {
+    "Whisper": {
+        "whisper_size": "large-v3"
+    },
+    "Wav2vec2": {
+        "size": "large"
+    },
+    "Wav2vec2Multi": {},
+    "Canary": {},
+}
+
+# languages each engine is benchmarked on
+ENGINE_LANGUAGES = {
+    "Whisper": ['en', 'zh', 'ja', 'de', 'fr', 'es'],
+    "Wav2vec2": ['en'],
+    "Wav2vec2Multi": ['en', 'zh', 'ja', 'de', 'fr', 'es'],
+    "Canary": ['en', 'de', 'es', 'fr'],
+}
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", required=True, choices=list(ENGINE_CONFIGS))
+    parser.add_argument("--type", default="segment", choices=["segment", "switch"],
+                        help="TalkBank dataset type")
+    parser.add_argument("--langs", default=None,
+                        help="comma separated lang codes, defaults to every language supported by the engine")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-batch-seconds", type=float, default=None,
+                        help="group samples of similar durations into batches of at most this padded duration "
+                             "(and at most --batch-size samples)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="DataLoader worker processes decoding audio")
+    parser.add_argument("--prefetch-factor", type=int, default=2,
+                        help="batches prefetched by each worker")
+    parser.add_argument("--device", default="cuda")
+    parser.add_argument("--precision", default=None, choices=["fp16", "fp32"],
+                        help="defaults to the engine's own default")
+    parser.add_argument("--cache-dir", default=None,
+                        help="serve audio from the memory-mapped cache of dataset_utils.materialize_talkbank_audio")
+    parser.add_argument("--output-dir", default="predictions")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+
+    cfg = dict(ENGINE_CONFIGS[args.engine], device=args.device)
+    if args.precision is not None:
+        cfg["fp16"] = args.precision == "fp16"
+    if args.langs is None:
+        available_languages = ENGINE_LANGUAGES[args.engine]
+    else:
+        available_languages = args.langs.split(",")
+
+    # Create engine
+    model = Engine.create(args.engine, **cfg)
+
+    # Transcribe all available languages
+    for lang_code in available_languages:
+        # Load dataset
+        dataset = TalkbankDataset(lang_code, args.type, cache_dir=args.cache_dir)
+        run_prediction(model,
+                       args.engine,
+                       dataset,
+                       lang_code,
+                       id_key=f"{args.type}_id",
+                       output_dir=args.output_dir,
+                       batch_size=args.batch_size,
+                       num_workers=args.workers,
+                       prefetch_factor=args.prefetch_factor,
+                       max_batch_seconds=args.max_batch_seconds)
@@ -0,0 +1,231 @@
+"""
+Append-only store of the predictions of an engine, replacing the layout of one
+<id>.txt file per sample:
+
+    predictions/<engine>/shard-00000.jsonl
+    predictions/<engine>/shard-00001.jsonl
+    ...
+
+Each line is a record {"id", "engine", "language", "text", "latency"}.
+Predictions written with the previous layout can be imported with
+
+    python -m src.prediction_store --engine Whisper
+"""
+import argparse
+import glob
+import json
+import os
+
+SHARD_PREFIX = "shard-"
+SHARD_SUFFIX = ".jsonl"
+
+
+def shard_index(path):
+    return int(os.path.basename(path)[len(SHARD_PREFIX):-len(SHARD_SUFFIX)])
+
+
+def shard_paths(engine_dir):
+    """
+    Return:
+        paths (list str): shards of engine_dir sorted by index, past shard 99999 as well
+    """
+    return sorted(
+        glob.glob(
+            os.path.join(engine_dir,
+                         SHARD_PREFIX + "*" + SHARD_SUFFIX)),
+        key=shard_index)
+
+
+def read_records(engine_dir):
+    """
+    Iterate over every record stored in engine_dir. A record cut by a crash
+    while it was being written (last line of a shard) is skipped.
+    """
+    for path in shard_paths(engine_dir):
+        with open(path, 'r', encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def load_texts(output_dir, engine_name):
+    """
+    Read-only access to the predictions of an engine, every shard is parsed once
+    and nothing is created for an engine without predictions
+    Return:
+        texts (dict): id -> text of every stored prediction
+    """
+    engine_dir = os.path.join(output_dir, engine_name)
+    return {record["id"]: record["text"] for record in read_records(engine_dir)}
+
+
+class PredictionStore(object):
+    """
+    Every run appends to new shards, existing ones are never rewritten. The
+    ids already stored are read once when the store is opened, they are the
+    resume state of the engine: finished samples are filtered out before any
+    audio is decoded.
+    """
+
+    def __init__(self,
+                 output_dir,
+                 engine_name,
+                 max_records_per_shard=100000,
+                 fsync_every=1000):
+        """
+        Params:
+            output_dir (str): root directory of the predictions of every engine
+            engine_name (str): name given to Engine.create
+            max_records_per_shard (int): a new shard is started past this number of records
+            fsync_every (int): records written between two fsync of the current shard
+        """
+        self.engine_name = engine_name
+        self.engine_dir = os.path.join(output_dir, engine_name)
+        self.max_records_per_shard = max_records_per_shard
+        self.fsync_every = fsync_every
+        os.makedirs(self.engine_dir, exist_ok=True)
+
+        self.completed = set(record["id"] for record in self.read())
+        self._file = None
+        self._shard_records = 0
+        self._unsynced_records = 0
+
+    def shard_paths(self):
+        return shard_paths(self.engine_dir)
+
+    def read(self):
+        """
+        Iterate over every stored record, see read_records
+        """
+        return read_records(self.engine_dir)
+
+    def texts(self):
+        """
+        Return:
+            texts (dict): id -> text of every stored prediction
+        """
+        return {record["id"]: record["text"] for record in self.read()}
+
+    def __contains__(self, sample_id):
+        return sample_id in self.completed
+
+    def __len__(self):
+        return len(self.completed)
+
+    def filter(self, ids):
+        """
+        Params:
+            ids (list str): id of every sample of a dataset, in dataset order
+        Return:
+            indices (list int): dataset indices of the samples still to transcribe
+        """
+        return [i for i, sample_id in enumerate(ids) if sample_id not in self.completed]
+
+    def _shard_path(self, index):
+        return os.path.join(self.engine_dir,
+                            f"{SHARD_PREFIX}{index:05d}{SHARD_SUFFIX}")
+
+    def write(self, ids, texts, language=None, latencies=None):
+        """
+        Append predictions to the current shard
+        Params:
+            ids (list str): sample ids
+            texts (list str): transcriptions
+            language (str): lang code of the samples
+            latencies (list float): engine time in seconds spent on each sample
+        """
+        if latencies is None:
+            latencies = [None] * len(ids)
+        for sample_id, text, latency in zip(ids, texts, latencies):
+            if self._file is None or self._shard_records >= self.max_records_per_shard:
+                self._open_new_shard()
+            record = {
+                "id": sample_id,
+                "engine": self.engine_name,
+                "language": language,
+                "text": text,
+                "latency": latency,
+            }
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._shard_records += 1
+            self._unsynced_records += 1
+        if self._file is not None:
+            self._file.flush()
+            if self._unsynced_records >= self.fsync_every:
+                self._sync()
+        self.completed.update(ids)
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced_records = 0
+
+    def _open_new_shard(self):
+        self.close()
+        paths = self.shard_paths()
+        index = shard_index(paths[-1]) + 1 if len(paths) > 0 else 0
+        # runs of the same engine started at once (one per language...) may pick
+        # the same index: the shard is created exclusively, the loser takes the next one
+        while True:
+            try:
+                self._file = open(self._shard_path(index), 'x', encoding="utf-8")
+                break
+            except FileExistsError:
+                index += 1
+        self._shard_records = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            self._sync()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def import_text_predictions(output_dir, engine_name, language=None, remove=False):
+    """
+    Import predictions written with the previous layout (output_dir/engine_name/<id>.txt)
+    Ids already in the store are skipped.
+    Params:
+        remove (bool): delete the .txt files once imported
+    Return:
+        count (int): number of imported predictions
+    """
+    with PredictionStore(output_dir, engine_name) as store:
+        paths = []
+        with os.scandir(store.engine_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".txt"):
+                    paths.append(entry.path)
+
+        ids, texts = [], []
+        for path in sorted(paths):
+            sample_id = os.path.basename(path)[:-len(".txt")]
+            if sample_id not in store:
+                with open(path, 'r') as f:
+                    ids.append(sample_id)
+                    texts.append(f.read())
+        store.write(ids, texts, language=language)
+
+    if remove:
+        for path in paths:
+            os.remove(path)
+    return len(ids)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import <id>.txt predictions into the prediction store")
+    parser.add_argument("--engine", required=True)
+    parser.add_argument("--output-dir", default="predictions")
+    parser.add_argument("--remove", action="store_true", help="delete the .txt files once imported")
+    args = parser.parse_args()
+
+    count = import_text_predictions(args.output_dir, args.engine, remove=args.remove)
+    print(f"Imported {count} predictions of {args.engine}")
@@ -0,0 +1,128 @@
+import time
+import traceback
+
+from torch.utils.data import DataLoader, Subset
+from tqdm import tqdm
+
+from src.dataset_utils import DurationBucketSampler
+from src.prediction_store import PredictionStore
+
+
+def collate_waveforms(batch):
+    """
+    Group (audio, metadata) samples for BaseEngine.process_batch.
+    Waveforms have different lengths and are kept as a list, each engine pads them itself.
+    """
+    audios, metadata = zip(*batch)
+    return list(audios), list(metadata)
+
+
+def get_dataloader(dataset,
+                   batch_size=1,
+                   num_workers=4,
+                   prefetch_factor=2,
+                   max_batch_seconds=None,
+                   indices=None):
+    """
+    Decode samples in worker processes while the engine runs on the previous batches
+    Params:
+        max_batch_seconds (float): if set, batches are built by DurationBucketSampler
+            (at most batch_size samples of similar durations) instead of in dataset order
+        indices (list int): only load these dataset indices, defaults to all
+    """
+    loader_kwargs = {
+        "num_workers": num_workers,
+        "prefetch_factor": prefetch_factor if num_workers > 0 else None,
+        "collate_fn": collate_waveforms,
+    }
+    if max_batch_seconds is not None:
+        batch_sampler = DurationBucketSampler(dataset.durations(),
+                                              max_batch_seconds=max_batch_seconds,
+                                              max_batch_size=batch_size,
+                                              indices=indices)
+        return DataLoader(dataset, batch_sampler=batch_sampler, **loader_kwargs)
+    if indices is not None:
+        dataset = Subset(dataset, indices)
+    return DataLoader(dataset,
+                      batch_size=batch_size,
+                      shuffle=False,
+                      **loader_kwargs)
+
+
+def run_prediction(model,
+                   engine_name,
+                   dataset,
+                   language,
+                   id_key='segment_id',
+                   output_dir='predictions',
+                   batch_size=1,
+                   num_workers=4,
+                   prefetch_factor=2,
+                   max_batch_seconds=None):
+    """
+    Transcribe a TalkbankDataset with an engine into the PredictionStore of the engine.
+    Samples already in the store are skipped before being decoded,
+    so that a run can be stopped and resumed at any time.
+    Params:
+        model (BaseEngine): engine created by Engine.create
+        language (str): lang code of the dataset
+        id_key (str): 'segment_id' or 'switch_id'
+        max_batch_seconds (float): see get_dataloader
+    """
+    with PredictionStore(output_dir, engine_name) as store:
+        indices = store.filter(dataset.ids(id_key))
+        if len(indices) == 0:
+            return
+
+        loader = get_dataloader(dataset,
+                                batch_size=batch_size,
+                                num_workers=num_workers,
+                                prefetch_factor=prefetch_factor,
+                                max_batch_seconds=max_batch_seconds,
+                                indices=indices)
+        for audios, metadata in tqdm(loader, total=len(loader)):
+            ids = [m[id_key] for m in metadata]
+            try:
+                start = time.perf_counter()
+                transcriptions = model.process_batch(audios, language)
+                # engine time, amortized over the batch
+                latency = (time.perf_counter() - start) / len(ids)
+                store.write(ids,
+                            transcriptions,
+                            language=language,
+                            latencies=[latency] * len(ids))
+
+            except KeyboardInterrupt:
+                break
+            except Exception:
+                print(traceback.format_exc())
+            else:
+                continue
+
+            # batches are rebuilt identically on resume: the samples of a failed
+            # batch are retried one by one so that only the failing ones are skipped
+            try:
+                process_one_by_one(model, store, ids, audios, language)
+            except KeyboardInterrupt:
+                break
+
+
+def process_one_by_one(model, store, ids, audios, language):
+    """
+    Transcribe the samples of a failed batch with model.process,
+    samples that fail again are logged and left out of the store
+    """
+    for sample_id, audio in zip(ids, audios):
+        if sample_id in store:
+            continue
+        try:
+            start = time.perf_counter()
+            transcription = model.process(audio, language)
+            latency = time.perf_counter() - start
+            store.write([sample_id],
+                        [transcription],
+                        language=language,
+                        latencies=[latency])
+        except Exception:
+            print(f"Skipping {sample_id}")
+            print(traceback.format_exc())
@@ -0,0 +1,2 @@
+from .metrics import edit_counts, score_pairs, error_rate
+from .table import score_table, aggregate_scores
@@ -0,0 +1,34 @@
+"""
+Score a table produced by src.collect_talkbank
+
+    python -m src.scoring talkbank_df_segments.parquet --by language --jobs 8
+"""
+import argparse
+
+import pandas as pd
+
+from .table import GROUP_COLUMNS, aggregate_scores, score_table
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("table", help=".parquet or .csv file from src.collect_talkbank")
+    parser.add_argument("--by", default=",".join(GROUP_COLUMNS),
+                        help="comma separated grouping columns, empty for one row per engine")
+    parser.add_argument("--jobs", type=int, default=1, help="processes normalizing the texts and computing the edit distances")
+    parser.add_argument("--no-normalize", action="store_true",
+                        help="score raw texts instead of applying preprocess_talkbank_text")
+    parser.add_argument("--output", default=None, help="save the aggregated scores as csv")
+    args = parser.parse_args()
+
+    if args.table.endswith(".parquet"):
+        df = pd.read_parquet(args.table)
+    else:
+        df = pd.read_csv(args.table)
+
+    scores = score_table(df, normalize=not args.no_normalize, n_jobs=args.jobs)
+    by = [c for c in args.by.split(",") if c]
+    results = aggregate_scores(scores, by=by)
+    print(results.to_string(index=False))
+    if args.output is not None:
+        results.to_csv(args.output, index=False)
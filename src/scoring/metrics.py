@@ -0,0 +1,109 @@
+"""
+WER / CER with substitution, deletion and insertion counts, computed with the
+same tokenization as jiwer (used by ResultsAndAnalysis.ipynb) but over integer
+encoded tokens, and in parallel over rows.
+"""
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from rapidfuzz.distance import Levenshtein
+
+# columns of the arrays returned by edit_counts / score_pairs
+COUNT_COLUMNS = ["substitutions", "deletions", "insertions", "ref_length"]
+
+MULTIPLE_SPACES_RE = re.compile(r"\s\s+")
+
+
+def tokenize_words(text):
+    """
+    jiwer.wer_default: collapse runs of whitespaces, strip, split on " "
+    """
+    text = MULTIPLE_SPACES_RE.sub(" ", text).strip()
+    return [w for w in text.split(" ") if len(w) > 0]
+
+
+def tokenize_chars(text):
+    """
+    jiwer.cer_default: strip, every character (spaces included) is a token
+    """
+    return list(text.strip())
+
+
+TOKENIZERS = {
+    "word": tokenize_words,
+    "char": tokenize_chars,
+}
+
+
+def encode_tokens(reference, hypothesis):
+    """
+    Map the tokens of a pair to integers so that the edit distance compares ints, not strings
+    """
+    vocabulary = {}
+    reference = [vocabulary.setdefault(t, len(vocabulary)) for t in reference]
+    hypothesis = [vocabulary.setdefault(t, len(vocabulary)) for t in hypothesis]
+    return reference, hypothesis
+
+
+def edit_counts(reference, hypothesis, unit="word"):
+    """
+    Params:
+        reference (str), hypothesis (str)
+        unit (str): 'word' or 'char'
+    Return:
+        counts (tuple int): substitutions, deletions, insertions, ref_length
+    """
+    tokenize = TOKENIZERS[unit]
+    reference, hypothesis = encode_tokens(tokenize(reference), tokenize(hypothesis))
+    substitutions = deletions = insertions = 0
+    for tag, _, _ in Levenshtein.editops(reference, hypothesis):
+        if tag == "replace":
+            substitutions += 1
+        elif tag == "delete":
+            deletions += 1
+        else:
+            insertions += 1
+    return substitutions, deletions, insertions, len(reference)
+
+
+def _edit_counts_chunk(args):
+    references, hypotheses, unit = args
+    return [edit_counts(r, h, unit) for r, h in zip(references, hypotheses)]
+
+
+def score_pairs(references, hypotheses, unit="word", n_jobs=1, chunksize=2000):
+    """
+    Edit counts of many (reference, hypothesis) pairs
+    Params:
+        references (list str), hypotheses (list str)
+        unit (str): 'word' or 'char'
+        n_jobs (int): number of processes, 1 scores in the current process
+        chunksize (int): pairs sent to a process at once
+    Return:
+        counts (np.ndarray): shape (n, 4), columns COUNT_COLUMNS
+    """
+    references = list(references)
+    hypotheses = list(hypotheses)
+    assert len(references) == len(hypotheses), "one hypothesis per reference is expected"
+
+    chunks = [(references[i:i + chunksize], hypotheses[i:i + chunksize], unit)
+              for i in range(0, len(references), chunksize)]
+    if n_jobs == 1 or len(chunks) <= 1:
+        results = map(_edit_counts_chunk, chunks)
+        counts = [c for chunk in results for c in chunk]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            counts = [c for chunk in executor.map(_edit_counts_chunk, chunks) for c in chunk]
+
+    return np.array(counts, dtype=np.int64).reshape(-1, len(COUNT_COLUMNS))
+
+
+def error_rate(counts):
+    """
+    (S + D + I) / N, from an array of COUNT_COLUMNS. NaN when the reference is empty.
+    """
+    counts = np.asarray(counts)
+    errors = counts[..., 0] + counts[..., 1] + counts[..., 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(counts[..., 3] > 0, errors / counts[..., 3], np.nan)
@@ -0,0 +1,113 @@
+"""
+Scoring of the tables produced by src.collect_talkbank: one row per sample,
+a 'transcription' reference column and one column per engine.
+"""
+import numpy as np
+import pandas as pd
+
+from src.transcript_processing.preprocess_talkbank_text import normalize_many
+
+from .metrics import COUNT_COLUMNS, error_rate, score_pairs
+
+# preprocess_talkbank_text options used for the published results
+NORMALIZE_OPTIONS = {
+    "remove_tags": True,
+    "remove_beg_unfinished_word": True,
+    "lower": True,
+    "remove_accents": True,
+}
+
+GROUP_COLUMNS = ["language", "subset", "channel"]
+
+# engine columns written by src.collect_talkbank (not imported, it needs the audio stack)
+ENGINE_COLUMNS = ["whisper", "wav2vec2-large-960h", "canary", "wav2vec256"]
+
+
+def normalize_texts(texts, n_jobs=1, options=None):
+    """
+    preprocess_talkbank_text over a Series, each distinct string is normalized once
+    Params:
+        options (dict): preprocess_talkbank_text options, defaults to NORMALIZE_OPTIONS
+    """
+    if options is None:
+        options = NORMALIZE_OPTIONS
+    return normalize_many(texts, n_jobs=n_jobs, **options)
+
+
+def score_table(df,
+                engines=None,
+                reference="transcription",
+                normalize=True,
+                normalize_options=None,
+                n_jobs=1,
+                keep_columns=GROUP_COLUMNS):
+    """
+    Score every engine column of a collected table
+    Params:
+        df (pd.DataFrame): table from src.collect_talkbank
+        engines (list str): engine columns, defaults to every known engine column of df
+        reference (str): reference column, rows without reference are not scored
+        normalize (bool): apply preprocess_talkbank_text on both sides
+        normalize_options (dict): its options, defaults to NORMALIZE_OPTIONS
+        n_jobs (int): processes used to normalize the texts and compute the edit distances
+        keep_columns (list str): columns of df copied into the result
+    Return:
+        scores (pd.DataFrame): one row per (sample, engine) having a prediction, with
+            the word counts (substitutions, deletions, insertions, ref_length), wer,
+            the char counts (char_*) and cer
+    """
+    if engines is None:
+        engines = [c for c in ENGINE_COLUMNS if c in df.columns]
+    if len(engines) == 0:
+        raise ValueError(f"no engine column to score, expected one of {ENGINE_COLUMNS}")
+    keep_columns = [c for c in keep_columns if c in df.columns]
+
+    # a missing reference would be scored as the string "nan"
+    missing = df[reference].isna()
+    if missing.any():
+        print(f"Skipping {missing.sum()} rows without {reference}")
+        df = df[~missing]
+
+    references = df[reference].astype(str)
+    if normalize:
+        references = normalize_texts(references, n_jobs=n_jobs, options=normalize_options)
+
+    scores = []
+    for engine in engines:
+        has_prediction = df[engine].notna()
+        hypotheses = df.loc[has_prediction, engine].astype(str)
+        if normalize:
+            hypotheses = normalize_texts(hypotheses, n_jobs=n_jobs, options=normalize_options)
+        engine_references = references[has_prediction]
+
+        engine_scores = df.loc[has_prediction, keep_columns].copy()
+        engine_scores.insert(0, "engine", engine)
+        for unit, prefix in [("word", ""), ("char", "char_")]:
+            counts = score_pairs(engine_references, hypotheses, unit=unit, n_jobs=n_jobs)
+            for i, column in enumerate(COUNT_COLUMNS):
+                engine_scores[prefix + column] = counts[:, i]
+            engine_scores["wer" if unit == "word" else "cer"] = error_rate(counts)
+        scores.append(engine_scores)
+
+    return pd.concat(scores)
+
+
+def aggregate_scores(scores, by=GROUP_COLUMNS):
+    """
+    Aggregate the output of score_table per engine and group
+    Params:
+        by (list str): grouping columns, [] for one row per engine
+    Return:
+        df (pd.DataFrame): summed counts, corpus level wer / cer (errors / reference length),
+            wer_mean / cer_mean (average of the per sample rates, as in ResultsAndAnalysis.ipynb)
+            and the number of samples
+    """
+    count_columns = COUNT_COLUMNS + ["char_" + c for c in COUNT_COLUMNS]
+    grouped = scores.groupby(["engine"] + list(by), sort=True, dropna=False)
+    df = grouped[count_columns].sum()
+    df["wer"] = error_rate(df[COUNT_COLUMNS].to_numpy())
+    df["cer"] = error_rate(df[["char_" + c for c in COUNT_COLUMNS]].to_numpy())
+    df["wer_mean"] = grouped["wer"].mean()
+    df["cer_mean"] = grouped["cer"].mean()
+    df["samples"] = grouped.size()
+    return df.reset_index()
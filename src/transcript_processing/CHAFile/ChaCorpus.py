@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parse every CHA file of a directory tree, in parallel, keeping the parsed files in a cache
+"""
+
+import os
+import pickle
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+from .ChaFile import ChaFile, PARSER_VERSION
+
+
+def _loadChaFile(chaFilePath, cachePath, options):
+	"""Internal use. Load a parsed CHA file from the cache, or parse it and cache it
+
+	Args:
+		chaFilePath (string): Path to the CHA file
+		cachePath (string): Path to the cached parse, None to disable the cache
+		options (dict): ChaFile arguments
+
+	Returns:
+		tuple: ChaFile (None if it failed) and error message (None if it succeeded)
+	"""
+	if cachePath is not None and os.path.isfile(cachePath):
+		try:
+			with open(cachePath, "rb") as f:
+				return pickle.load(f), None
+		except Exception:
+			pass #corrupted or incompatible, parsed again
+
+	try:
+		cha = ChaFile(chaFilePath, **options)
+	except Exception as e:
+		return None, f"{type(e).__name__}: {e}"
+
+	if cachePath is not None:
+		tmpPath = f"{cachePath}.{os.getpid()}.tmp"
+		with open(tmpPath, "wb") as f:
+			pickle.dump(cha, f, protocol=pickle.HIGHEST_PROTOCOL)
+		os.replace(tmpPath, cachePath)
+
+	return cha, None
+
+
+class ChaCorpus:
+
+	def __init__(self, directory, cacheDir = None, workers = 1, verbose = False, **options):
+		"""Constructor. Finds the CHA files in directory and its subdirectories and parse them
+
+		Args:
+			directory (string): Root of the corpus
+			cacheDir (string, optional): Parsed files are stored there and loaded back when the CHA file (path, modification time and size),
+				the ChaFile options and PARSER_VERSION didn't change. Defaults to None, which disables the cache.
+			workers (int, optional): Number of processes parsing the files, 1 parses them in the current process. Defaults to 1.
+			verbose (bool, optional): Same as ChaFile. Defaults to False.
+			options: Other ChaFile arguments (ignoreSpeakers, onlyCDS, includeLines, language)
+		"""
+		self.directory = directory
+		self.cacheDir = cacheDir
+		self.workers = workers
+		self.verbose = verbose
+		self.options = options
+
+		self.files = {} #path -> ChaFile
+		self.errors = {} #path -> error message, for the files that couldn't be parsed
+
+		self.paths = []
+		for root, _, filenames in os.walk(directory):
+			for filename in filenames:
+				if filename.endswith(".cha"):
+					self.paths.append(os.path.join(root, filename))
+		self.paths.sort()
+
+		if self.cacheDir is not None:
+			os.makedirs(self.cacheDir, exist_ok = True)
+
+		self.load()
+
+	def _getCachePath(self, chaFilePath):
+		"""Internal use. Path of the cached parse of a CHA file
+
+		Args:
+			chaFilePath (string): Path to the CHA file
+
+		Returns:
+			string: Path in cacheDir, None if the cache is disabled
+		"""
+		if self.cacheDir is None:
+			return None
+
+		stat = os.stat(chaFilePath)
+		key = repr(( os.path.abspath(chaFilePath), stat.st_mtime_ns, stat.st_size, PARSER_VERSION, sorted(self.options.items()) ))
+		return os.path.join(self.cacheDir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pickle")
+
+	def load(self):
+		"""Parse (or load from the cache) every CHA file. Files that fail are reported in self.errors
+		"""
+		self.files = {}
+		self.errors = {}
+
+		options = dict(self.options, verbose = self.verbose)
+		tasks = [ (p, self._getCachePath(p), options) for p in self.paths ]
+
+		if self.workers == 1 or len(tasks) <= 1:
+			results = [ _loadChaFile(*t) for t in tasks ]
+		else:
+			with ProcessPoolExecutor(max_workers = self.workers) as executor:
+				results = list(executor.map(_loadChaFile, *zip(*tasks)))
+
+		for path, (cha, error) in zip(self.paths, results):
+			if error is None:
+				self.files[path] = cha
+			else:
+				self.errors[path] = error
+
+	def getFiles(self):
+		"""Get parsed files
+
+		Returns:
+			list: ChaFile, sorted by path
+		"""
+		return list(self.files.values())
+
+	def __getitem__(self, chaFilePath):
+		return self.files[chaFilePath]
+
+	def __iter__(self):
+		return iter(self.files.values())
+
+	def __len__(self):
+		return len(self.files)
@@ -10,6 +10,9 @@ Created on Mon Oct 29 14:59:04 2018
 import os
 from subprocess import getstatusoutput
 import re
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import MutableMapping
 from .log import Log
 
 from lexical_diversity import lex_div as ld
@@ -129,13 +132,160 @@ MISSING_VALUE = "?"
 WORD_XXX = "xxx" #the word wasn't understood by the transcriber
 ###############################################
 
+# Increase it whenever the parsed output changes, parses cached by ChaCorpus are then discarded
+PARSER_VERSION = 1
+
+class _SlottedRecord(MutableMapping):
+	"""Internal use. Base of Utterance and MorUnit, fields known in advance are stored in slots
+	and the others (i.e. custom tiers) in a dict created on demand.
+	They are read and written as a dict using the LINE, TIER and MOR_UNIT constants
+	"""
+	__slots__ = ("_extra",)
+	_fields = {} #constant -> attribute
+
+	def __init__(self, data = None):
+		"""
+		Args:
+			data (dict, optional): Initial fields. Defaults to None.
+		"""
+		self._extra = None
+		if data:
+			for key, value in data.items():
+				attribute = self._fields.get(key)
+				if attribute is not None:
+					setattr(self, attribute, value)
+				else:
+					self[key] = value
+
+	def __getitem__(self, key):
+		attribute = self._fields.get(key)
+		if attribute is not None:
+			try:
+				return getattr(self, attribute)
+			except AttributeError:
+				raise KeyError(key) from None
+		if self._extra is None:
+			raise KeyError(key)
+		return self._extra[key]
+
+	def __setitem__(self, key, value):
+		attribute = self._fields.get(key)
+		if attribute is not None:
+			setattr(self, attribute, value)
+		else:
+			if self._extra is None:
+				self._extra = {}
+			self._extra[key] = value
+
+	def __delitem__(self, key):
+		attribute = self._fields.get(key)
+		if attribute is not None:
+			try:
+				delattr(self, attribute)
+			except AttributeError:
+				raise KeyError(key) from None
+		elif self._extra is not None:
+			del self._extra[key]
+		else:
+			raise KeyError(key)
+
+	def __contains__(self, key):
+		attribute = self._fields.get(key)
+		if attribute is not None:
+			return hasattr(self, attribute)
+		return self._extra is not None and key in self._extra
+
+	def __iter__(self):
+		for key, attribute in self._fields.items():
+			if hasattr(self, attribute):
+				yield key
+		if self._extra is not None:
+			yield from self._extra
+
+	def __len__(self):
+		size = sum(1 for attribute in self._fields.values() if hasattr(self, attribute))
+		if self._extra is not None:
+			size += len(self._extra)
+		return size
+
+	def __repr__(self):
+		return f"{type(self).__name__}({self.toDict()!r})"
+
+	def toDict(self):
+		"""Get a plain dict copy (i.e. for json)
+
+		Returns:
+			dict: Fields of the record, MOR units are also converted
+		"""
+		return { k : [ v.toDict() if isinstance(v, _SlottedRecord) else v for v in value ] if isinstance(value, list) else value
+			for k, value in self.items() }
+
+class Utterance(_SlottedRecord):
+	"""A parsed utterance. Access data using the LINE constants (line[LINE_SPEAKER]) or
+	the attributes (line.speaker)
+	"""
+	_fields = {
+		LINE_NUMBER : "number",
+		LINE_UTTERANCE_NUMBER : "utteranceNumber",
+		LINE_SPEAKER : "speaker",
+		LINE_UTTERANCE : "utterance",
+		LINE_ADDRESSEE : "addressee",
+		LINE_BULLET : "bullet",
+		TIER_MOR : "mor",
+		TIER_XDS : "xds",
+		LINE_NOUNS : "nouns",
+		LINE_ADJECTIVES : "adjectives",
+		LINE_VERBS : "verbs",
+		LINE_LIGHT_VERBS : "lightVerbs",
+		LINE_MOR_TO_WORDS : "morToWords",
+	}
+	__slots__ = tuple(_fields.values())
+
+class MorUnit(_SlottedRecord):
+	"""A parsed MOR unit (one word). Access data using the MOR_UNIT constants (morUnit[MOR_UNIT_LEXEMA])
+	or the attributes (morUnit.lexema)
+	"""
+	_fields = {
+		MOR_UNIT_CATEGORIA : "categoria",
+		MOR_UNIT_LEXEMA : "lexema",
+		MOR_UNIT_EXTRA : "extra",
+		MOR_UNIT_AMBIGUOUS : "ambiguo",
+	}
+	__slots__ = tuple(_fields.values())
+
+class ChatGrammar:
+	"""Compiled regular expressions of the CHAT format, shared by every ChaFile
+	"""
+
+	def __init__(self):
+		# A record is a block of headers or an utterance with its dependent tiers. It starts with
+		# "*SPK:\t", "%tier:\t" or "@Header:\t" and lasts until the next "*SPK:\t" or "@End".
+		# None of them spans a line break, so records can be cut while reading line by line
+		self.recordStart = re.compile(r"[\*%@]\w*:\t")
+		self.recordEnd = re.compile(r"\*\w*:\t|@End")
+		# tiers of an utterance, each one lasts until the next tier
+		self.tier = re.compile(r"(?P<tier>[\*%][\w-]*):\s*")
+		self.bullet = re.compile(r"\x15(?P<from>\d*)_(?P<to>\d*)\x15")
+		self.language = re.compile(r"@Languages:.(.+)")
+		self.morUnit = re.compile(r"([A-zÀ-ú:#\?']*)\|([A-zÀ-ú]*)(.*)")
+
+		# processMorToWordsInLine
+		self.foreignUtterance = re.compile(r"^\[\- .*?\]")
+		self.addresseeTag = re.compile(r"\[\+.*\]")
+		self.foreignWord = re.compile(r"[\w'`´]*?@\w*?:\w*")
+		self.replacedWord = re.compile(r"(?:\<&?=?[\w\s'@,\-&]*\>|\w*)\s*?\[\: ([\w\s'@,-]*)\]")
+		self.explainedWord = re.compile(r"(?:\<(&?=?[\w\s'@,\-&\(\)]*)\>|(\S*))\s*?\[=!\s[\s\w]*\]")
+		self.bracket = re.compile(r"\[[^\/]*?\]")
+
+GRAMMAR = ChatGrammar()
+
 log = Log()
 
 class ChaFile:
 
 	def __init__(self, chaFilePath,
 				 ignoreSpeakers = [ SPEAKER_SILENCE ], onlyCDS = False, includeLines = [],
-				 verbose = True, language = None):
+				 verbose = True, language = None, stream = False):
 		"""Constructor. Loads the CHA file and parse it
 
 		Args:
@@ -145,6 +295,7 @@ class ChaFile:
 			includeLines (list, optional): Only these line numbers will be parsed. Defaults to [] which means all lines.
 			verbose (bool, optional): Extra information will be printed when processing. Defaults to False.
 			language (string, optional): Use one of the LANGUAGE constants or None for parsing it from the CHA file. Defaults to None.
+			stream (bool, optional): The file won't be parsed on construction, utterances are read with iterLines and getLines stays empty. Defaults to False.
 		"""
 
 		self.noBullets = True
@@ -152,10 +303,18 @@ class ChaFile:
 		self.speakers = []
 		self.language = None
 		self.morAmbiguousLines = []
+		self._morAmbiguousLines = set()
+
+		# indexes of self.lines, see _indexLines
+		self._linesByNumber = {}
+		self._lineNumbers = []
+		self._speakerPositions = {}
+		self._addresseePositions = {}
 
 		self.processedVerbs = False
 		self.processedNouns = False
 		self.processedAdjectives = False
+		self._stats = None #see stats
 
 		self.morFound = False #true if MOR was found in at least one line
 
@@ -170,7 +329,8 @@ class ChaFile:
 		self.filename = self.filename[0:self.filename.rfind(".")]
 
 		self.setLanguage(language)
-		self.processLines()
+		if not stream:
+			self.processLines()
 
 	def processLines(self):
 		"""Internal use. Main function that parses the CHA file
@@ -179,101 +339,206 @@ class ChaFile:
 			FileNotFoundError: The path to the CHA file does not exist
 		"""
 
-		if not os.path.isfile(self.chaFilePath):
-			raise FileNotFoundError()
+		self.lines = list(self.iterLines())
 
-		with open(self.chaFilePath,"r", encoding="utf-8") as f:
-			txtCHA = f.read()
+		#if MOR is found on file all lines should have at least an empty TIER_MOR
+		if self.morFound:
+			for l in self.getLines():
+				if TIER_MOR not in l:
+					l[TIER_MOR] = []
 
-		prog = re.compile(r"[\*%@]\w*:\t.*?(?=\*\w*:\t|@End|\Z)", re.S)#, re.X)
-		parsedCHA = prog.findall(txtCHA)
+		self._indexLines()
+
+	def _indexLines(self):
+		"""Internal use. Index self.lines by line number, speaker and addressee. Speakers and addressees
+		are indexed by the positions of their utterances in self.lines, in order
+		"""
+		self._linesByNumber = {}
+		self._speakerPositions = {}
+		self._addresseePositions = {}
+
+		for i, l in enumerate(self.lines):
+			self._linesByNumber[ l[LINE_NUMBER] ] = l
+			self._speakerPositions.setdefault(l.get(LINE_SPEAKER), []).append(i)
+			self._addresseePositions.setdefault(l[LINE_ADDRESSEE], []).append(i)
+
+		self._lineNumbers = sorted(self._linesByNumber)
+
+	def _getFirstPosition(self, speaker):
+		"""Internal use. Position in self.lines of the first utterance of a speaker
+
+		Args:
+			speaker (str): Speaker
+
+		Returns:
+			int: Position, len(self.lines) if the speaker has no utterance
+		"""
+		positions = self._speakerPositions.get(speaker)
+		return positions[0] if positions else len(self.lines)
+
+	def _getLinesByAddressee(self, addressee):
+		"""Internal use. Select utterances using the speaker and addressee indexes
+
+		Args:
+			addressee (str): ADDRESSEE_ALL, ADDRESSEE_CHILD_DIRECTED, ADDRESSEE_OVER_HEARD, ADDRESSEE_CHILD_PRODUCED or ADDRESSEE_ADULT
+
+		Returns:
+			list: Utterances, in order
+		"""
+		if addressee == ADDRESSEE_ALL:
+			return self.getLines()
+
+		toChild = self._addresseePositions.get(SPEAKER_TARGET_CHILD, [])
+		byChild = self._speakerPositions.get(SPEAKER_TARGET_CHILD, [])
+
+		if addressee == ADDRESSEE_CHILD_DIRECTED:
+			positions = toChild
+		elif addressee == ADDRESSEE_CHILD_PRODUCED:
+			positions = byChild
+		elif addressee == ADDRESSEE_OVER_HEARD:
+			excluded = set(toChild).union(byChild)
+			positions = [ i for i in range(len(self.lines)) if i not in excluded ]
+		elif addressee == ADDRESSEE_ADULT:
+			excluded = set(byChild)
+			positions = [ i for i in self._addresseePositions.get(SPEAKER_ADULT, []) if i not in excluded ]
+		else:
+			positions = []
+
+		return [ self.lines[i] for i in positions ]
+
+	def iterLines(self):
+		"""Parse the CHA file and yield its utterances one by one. Only the current record is read
+		in memory, use it with stream=True for very large files
+
+		Utterances without MOR are given an empty TIER_MOR once a %mor tier has been found, the ones
+		yielded before the first %mor tier can't get it (getLines does have it on every utterance)
+
+		Raises:
+			FileNotFoundError: The path to the CHA file does not exist
+
+		Yields:
+			Utterance: Access data using the LINE constants
+		"""
+
+		if not os.path.isfile(self.chaFilePath):
+			raise FileNotFoundError()
 
-		self.lines = []
 		self.speakers = []
 		lineNumber = 1
 		utteranceNumber = 0
+		includeLines = set(self.includeLines)
 
-		for r in parsedCHA:
-			#is header
-			if r[0] == "@":
-				lineNumber += r.count("\n") + 2 #2= utf8 and begin 
-				continue
+		with open(self.chaFilePath,"r", encoding="utf-8") as f:
+			for r in self._iterRecords(f):
+				#is header
+				if r[0] == "@":
+					lineNumber += r.count("\n") + 2 #2= utf8 and begin 
+					continue
+
+				line = Utterance({
+					LINE_NUMBER : lineNumber,
+					LINE_UTTERANCE_NUMBER : 0
+				})
+
+				skipLine = False
+
+				#build line
+				tiers = list(GRAMMAR.tier.finditer(r))
+				for i, m in enumerate(tiers):
+					tier = m.group("tier")
+					contentEnd = tiers[i + 1].start() if i + 1 < len(tiers) else len(r)
+					content = r[m.end():contentEnd].replace("\t"," ").replace("\n", "")
+
+					if m.group("tier")[0] == "*": #is speaker
+						speaker = tier[1:]
+						if not speaker in self.ignoreSpeakers:
+							if not speaker in self.speakers:
+								self.speakers.append(speaker)
+
+							line[LINE_SPEAKER] = speaker
+							line[LINE_UTTERANCE] = content
+
+							if BULLET_TAG in content:
+								progBullet = GRAMMAR.bullet
+								parsedBullet = list(progBullet.finditer(content))
+
+								if len(parsedBullet) > 0 :
+									bulletFrom = int(parsedBullet[0].group("from"))
+									bulletTo = int(parsedBullet[-1].group("to"))
+									line[ LINE_BULLET ] = [bulletFrom, bulletTo]
+									line[ LINE_UTTERANCE ] = progBullet.sub("", line[ LINE_UTTERANCE ])
+								else:
+									#esto sucede cuando los bullets son de la forma %snd:"filename"_from_to
+									line[ LINE_UTTERANCE ] = line[ LINE_UTTERANCE ].replace(BULLET_TAG, "").strip()
+						else:
+							skipLine = True
+							break
+					else:
+						tierName = tier[1:]
+						line[tierName] = content
+
+						if tierName == "mor":
+							self.morFound = True
+
+						#no es realmente un tier
+						#esto sucede cuando los bullets son de la forma %snd:"filename"_from_to
+						if tierName == "snd":
+							del line[tierName]
+							lstContent = content.replace(BULLET_TAG, "").split("_")
+							line[ LINE_BULLET ] = [int(lstContent[-2]), int(lstContent[-1])]
+
+						if hasattr(self, f"_parse{tierName.capitalize()}" ):
+							tierProcessFunction = getattr(self, f"_parse{tierName.capitalize()}" )
+							line[tierName] = tierProcessFunction( line[tierName], line[LINE_NUMBER] )
 			
-			prog = re.compile(r"(?P<tier>[\*%][\w-]*):[\s]*(?P<content>.*?)(?=[\*%][\w-]*:[\s]*|@End|\Z)", re.S)
 			
-			line = {
-				LINE_NUMBER : lineNumber,
-				LINE_UTTERANCE_NUMBER : 0
-			}
+				if not skipLine:
+					self._setAddressee(line)
+
+					if not (self.onlyCDS and line[LINE_ADDRESSEE] not in [SPEAKER_TARGET_CHILD, SPEAKER_BOTH]):
+						if not speaker in self.ignoreSpeakers:
+							if len(includeLines) == 0 or line[ LINE_NUMBER ] in includeLines:
+								utteranceNumber += 1
+								line[LINE_UTTERANCE_NUMBER] = utteranceNumber
+								if self.morFound and TIER_MOR not in line:
+									line[TIER_MOR] = []
+								yield line
 			
-			skipLine = False
-
-			#build line
-			for m in prog.finditer(r):
-				tier = m.group("tier")
-				content = m.group("content").replace("\t"," ").replace("\n", "")
-
-				if m.group("tier")[0] == "*": #is speaker
-					speaker = tier[1:]
-					if not speaker in self.ignoreSpeakers:
-						if not speaker in self.speakers:
-							self.speakers.append(speaker)
-
-						line[LINE_SPEAKER] = speaker
-						line[LINE_UTTERANCE] = content
-
-						if BULLET_TAG in content:
-							regexBullet = r"\x15(?P<from>\d*)_(?P<to>\d*)\x15"
-							progBullet = re.compile(regexBullet)#, re.S)
-							parsedBullet = list(progBullet.finditer(content))
-
-							if len(parsedBullet) > 0 :
-								bulletFrom = int(parsedBullet[0].group("from"))
-								bulletTo = int(parsedBullet[-1].group("to"))
-								line[ LINE_BULLET ] = [bulletFrom, bulletTo]
-								line[ LINE_UTTERANCE ] = progBullet.sub("", line[ LINE_UTTERANCE ])
-							else:
-								#esto sucede cuando los bullets son de la forma %snd:"filename"_from_to
-								line[ LINE_UTTERANCE ] = line[ LINE_UTTERANCE ].replace(BULLET_TAG, "").strip()
-					else:
-						skipLine = True
+				lineNumber += r.count("\n")
+
+	def _iterRecords(self, f):
+		"""Internal use. Cut the CHA file into records in a single pass over its lines
+
+		Args:
+			f (iterable): Lines of the CHA file, i.e. an open file
+
+		Yields:
+			str: A block of headers or an utterance with its dependent tiers
+		"""
+		parts = None #current record
+		for text in f:
+			pos = 0
+			while True:
+				if parts is None:
+					m = GRAMMAR.recordStart.search(text, pos)
+					if m is None:
 						break
+					parts = []
+					pos = m.start()
+					m = GRAMMAR.recordEnd.search(text, m.end())
 				else:
-					tierName = tier[1:]
-					line[tierName] = content
-
-					if tierName == "mor":
-						self.morFound = True
-
-					#no es realmente un tier
-					#esto sucede cuando los bullets son de la forma %snd:"filename"_from_to
-					if tierName == "snd":
-						del line[tierName]
-						lstContent = content.replace(BULLET_TAG, "").split("_")
-						line[ LINE_BULLET ] = [int(lstContent[-2]), int(lstContent[-1])]
-
-					if hasattr(self, f"_parse{tierName.capitalize()}" ):
-						tierProcessFunction = getattr(self, f"_parse{tierName.capitalize()}" )
-						line[tierName] = tierProcessFunction( line[tierName], line[LINE_NUMBER] )
-			
-			
-			if not skipLine:
-				self._setAddressee(line)
-
-				if not (self.onlyCDS and line[LINE_ADDRESSEE] not in [SPEAKER_TARGET_CHILD, SPEAKER_BOTH]):
-					if not speaker in self.ignoreSpeakers:
-						if len(self.includeLines) == 0 or line[ LINE_NUMBER ] in self.includeLines:
-							utteranceNumber += 1
-							line[LINE_UTTERANCE_NUMBER] = utteranceNumber
-							self.lines.append(line)
-			
-			lineNumber += r.count("\n")
+					m = GRAMMAR.recordEnd.search(text, pos)
 
-		#if MOR is found on file all lines should have at least an empty TIER_MOR
-		if self.morFound:
-			for l in self.getLines():
-				if TIER_MOR not in l:
-					l[TIER_MOR] = []
+				if m is None:
+					parts.append(text[pos:])
+					break
+				parts.append(text[pos:m.start()])
+				yield "".join(parts)
+				parts = None
+				pos = m.start()
+
+		if parts is not None:
+			yield "".join(parts)
 
 	def getLines(self):
 		"""Get an array of parsed utterances
@@ -290,13 +555,9 @@ class ChaFile:
 			lineNumber (int): Line number
 
 		Returns:
-			dict: Utterance
+			Utterance: The utterance, None if it was not parsed
 		"""
-		for line in self.lines:
-			if line[LINE_NUMBER] == lineNumber:
-				return line
-
-		return None
+		return self._linesByNumber.get(lineNumber)
 
 	def getLinesFromTo(self, lineFrom, lineTo):
 		"""Get a range of utterances
@@ -308,13 +569,9 @@ class ChaFile:
 		Returns:
 			list: Utterances. Access data using the LINE constants
 		"""
-		linesToReturn = []
+		numbers = self._lineNumbers[ bisect_left(self._lineNumbers, lineFrom) : bisect_left(self._lineNumbers, lineTo) ]
 
-		for line in self.lines:
-			if line[LINE_NUMBER] >= lineFrom and line[LINE_NUMBER] < lineTo:
-				linesToReturn.append(line)
-
-		return linesToReturn
+		return [ self._linesByNumber[n] for n in numbers ]
 
 	def getLinesBySpeakers(self):
 		"""Get all parsed utterance grouped by speaker
@@ -322,15 +579,7 @@ class ChaFile:
 		Returns:
 			list: Utterances. Access data using the LINE constants
 		"""
-		linesBySpeakers = {}
-
-		for line in self.lines:
-			if not line[LINE_SPEAKER] in linesBySpeakers:
-				linesBySpeakers[ line[LINE_SPEAKER] ] = []
-
-			linesBySpeakers[ line[LINE_SPEAKER] ].append(line)
-
-		return linesBySpeakers
+		return { speaker : [ self.lines[i] for i in positions ] for speaker, positions in self._speakerPositions.items() }
 
 	def getSpeakers(self):
 		"""Get all speakers involved in this transcription
@@ -350,8 +599,6 @@ class ChaFile:
 			FileNotFoundError: -
 		"""
 		if lang == None:
-			LANGUAGE_RE = "@Languages:.(.+)"
-
 			if not os.path.isfile(self.chaFilePath):
 				raise FileNotFoundError()
 
@@ -360,7 +607,7 @@ class ChaFile:
 				while loop:
 					line = f.readline()
 					if line:
-						x = re.match(LANGUAGE_RE, line)
+						x = GRAMMAR.language.match(line)
 						if x is not None:
 							language = x.group(1)
 							if language in [LANGUAGE_SPANISH, LANGUAGE_ENGLISH]:
@@ -400,34 +647,32 @@ class ChaFile:
 		utt = line[LINE_UTTERANCE]
 
 		# remove everything if utterance is in a foreign language
-		if re.match(r"^\[\- .*?\]", utt):
+		if GRAMMAR.foreignUtterance.match(utt):
 			utt = ""
 
 		# remove [+ TARGET]		
-		utt = re.sub(r"\[\+.*\]", "", utt)
+		utt = GRAMMAR.addresseeTag.sub("", utt)
 
 		# remove words with @ and : (usually for foreign words inside a utt)
-		utt = re.sub(r"[\w'`´]*?@\w*?:\w*", "", utt)
+		utt = GRAMMAR.foreignWord.sub("", utt)
 
 		# deletes all <slang_word> [: some_replacing_word] and keeps some_replacing_word
-		replacingRegEx = r"(?:\<&?=?[\w\s'@,\-&]*\>|\w*)\s*?\[\: ([\w\s'@,-]*)\]"
-		prog = re.compile(replacingRegEx)
-		while prog.search(utt):
-			m = prog.search(utt)
-
+		prog = GRAMMAR.replacedWord
+		m = prog.search(utt)
+		while m:
 			replaceBy = ""
 			if m.group(1):
 				replaceBy = m.group(1)
 
-			utt = re.sub(replacingRegEx, replaceBy, utt, count=1)
+			utt = prog.sub(replaceBy, utt, count=1)
+			m = prog.search(utt)
 
 		# deletes all [=! some_comment] and keeps whats inside <>
 		# i.e <you get your dog> [=! imitates] => you get your dog
 		# replacingRegEx = r"(?:\<([^\<\>]*)\>|(\w+))\s*?\[=!\s[^\<\>]*\]"
-		replacingRegEx = r"(?:\<(&?=?[\w\s'@,\-&\(\)]*)\>|(\S*))\s*?\[=!\s[\s\w]*\]"
-		prog = re.compile(replacingRegEx)
-		while prog.search(utt):
-			m = prog.search(utt)
+		prog = GRAMMAR.explainedWord
+		m = prog.search(utt)
+		while m:
 			replaceBy = ""
 
 			if m.group(1):
@@ -435,10 +680,11 @@ class ChaFile:
 			elif m.group(2):
 				replaceBy = m.group(2)
 
-			utt = re.sub(replacingRegEx, replaceBy, utt, count=1)
+			utt = prog.sub(replaceBy, utt, count=1)
+			m = prog.search(utt)
 		
 		# remove []		
-		utt = re.sub(r"\[[^\/]*?\]", "", utt)
+		utt = GRAMMAR.bracket.sub("", utt)
 
 		utt = utt.split(" ")
 
@@ -986,25 +1232,8 @@ class ChaFile:
 					else:
 						c[v] = 1
 		
-		if addressee == ADDRESSEE_ALL:
-			for l in self.getLines():
-				add( l )
-		elif addressee == ADDRESSEE_CHILD_DIRECTED:
-			for l in self.getLines():
-				if l[LINE_ADDRESSEE] == SPEAKER_TARGET_CHILD:
-					add( l )
-		elif addressee == ADDRESSEE_CHILD_PRODUCED:
-			for l in self.getLines():
-				if l[LINE_SPEAKER] == SPEAKER_TARGET_CHILD:
-					add( l )
-		elif addressee == ADDRESSEE_OVER_HEARD:
-			for l in self.getLines():
-				if l[LINE_ADDRESSEE] != SPEAKER_TARGET_CHILD and l[LINE_SPEAKER] != SPEAKER_TARGET_CHILD :
-					add( l )
-		elif addressee == ADDRESSEE_ADULT:
-			for l in self.getLines():
-				if l[LINE_ADDRESSEE] == SPEAKER_ADULT and l[LINE_SPEAKER] != SPEAKER_TARGET_CHILD :
-					add( l )
+		for l in self._getLinesByAddressee(addressee):
+			add( l )
 		
 		# print(c)
 
@@ -1013,6 +1242,74 @@ class ChaFile:
 		else:
 			return len(c.keys())
 
+	def stats(self, countCopAux = False, processLightVerbs = True):
+		"""Count tokens and types of every kind of word for every addressee, and get the tokens used for
+		lexical diversity, in a single pass over the utterances. The result is cached so, as in populateVerbs,
+		only countCopAux and processLightVerbs of the first call are used
+
+		Args:
+			countCopAux (bool, optional): Should we count cop and aux as verbs ?. Defaults to False.
+			processLightVerbs (bool, optional): Should we process light verbs. Defaults to True.
+
+		Returns:
+			dict: "counts": { what : { addressee : { countType : int } } }, same values as count(what, addressee, countType)
+				"utterances": same value as countUtterancesByAddressee(), keyed by LINE_ADDRESSEE and without empty utterances
+				"lexicalDiversityTokens": { addressee : list }, same values as getLexicalDiversityTokens(addressee)
+		"""
+		assert self.morFound, "MOR tier not found"
+
+		if self._stats is not None:
+			return self._stats
+
+		self.populateVerbs(countCopAux=countCopAux, processLightVerbs=processLightVerbs)
+		self.populateNouns()
+		self.populateAdjectives()
+
+		addressees = [ ADDRESSEE_ALL, ADDRESSEE_CHILD_DIRECTED, ADDRESSEE_CHILD_PRODUCED, ADDRESSEE_OVER_HEARD, ADDRESSEE_ADULT ]
+		categories = [ LINE_VERBS, LINE_NOUNS, LINE_ADJECTIVES ]
+
+		counters = { what : { a : Counter() for a in addressees } for what in [ LINE_UTTERANCE ] + categories }
+		utterances = {}
+		tokens = { a : [] for a in addressees }
+
+		for l in self.getLines():
+			toChild = l[LINE_ADDRESSEE] == SPEAKER_TARGET_CHILD
+			byChild = l[LINE_SPEAKER] == SPEAKER_TARGET_CHILD
+
+			lineAddressees = [ ADDRESSEE_ALL ]
+			if toChild:
+				lineAddressees.append(ADDRESSEE_CHILD_DIRECTED)
+			if byChild:
+				lineAddressees.append(ADDRESSEE_CHILD_PRODUCED)
+			if not toChild and not byChild:
+				lineAddressees.append(ADDRESSEE_OVER_HEARD)
+			if l[LINE_ADDRESSEE] == SPEAKER_ADULT and not byChild:
+				lineAddressees.append(ADDRESSEE_ADULT)
+
+			mor = l[TIER_MOR]
+			words = [ morUnit[MOR_UNIT_CATEGORIA] + "|" + morUnit[MOR_UNIT_LEXEMA] + morUnit[MOR_UNIT_EXTRA] for morUnit in mor ]
+			token = "".join(words)
+			lexemes = { what : [ mor[index][MOR_UNIT_LEXEMA] for index in l[what] ] for what in categories }
+
+			if not self.isUtteranceEmpty(l):
+				utterances[l[LINE_ADDRESSEE]] = utterances.get(l[LINE_ADDRESSEE], 0) + 1
+
+			for a in lineAddressees:
+				if a != ADDRESSEE_ADULT: #as in getLexicalDiversityTokens
+					tokens[a].append(token)
+				counters[LINE_UTTERANCE][a].update(words)
+				for what in categories:
+					counters[what][a].update(lexemes[what])
+
+		self._stats = {
+			"counts" : { what : { a : { COUNT_TYPE_TOKENS : sum(c.values()), COUNT_TYPE_TYPES : len(c) }
+					for a, c in byAddressee.items() } for what, byAddressee in counters.items() },
+			"utterances" : utterances,
+			"lexicalDiversityTokens" : tokens
+		}
+
+		return self._stats
+
 	def findLinesByMorCriteria(self, criteria, criteriaType=MOR_UNIT_CATEGORIA):
 		"""Finds utterances that follow a criteria
 
@@ -1057,23 +1354,19 @@ class ChaFile:
 		"""
 		return self._checkCriteria( line["mor"], criteria, criteriaType )
 
-	def getLexicalDiversity(self, addressee=ADDRESSEE_ALL, metric=LEXICAL_DIVERSITY_HDD, extraParam = None):
+	def getLexicalDiversityTokens(self, addressee=ADDRESSEE_ALL):
+		"""Tokens given to lex_div by getLexicalDiversity, one by utterance
+
+		Args:
+			addressee (str, optional): ADDRESSEE_ALL, ADDRESSEE_CHILD_DIRECTED, ADDRESSEE_OVER_HEARD or ADDRESSEE_CHILD_PRODUCED. Defaults to ADDRESSEE_ALL.
+
+		Returns:
+			list: MOR units of each utterance joined in a single string, empty for ADDRESSEE_ADULT
+		"""
 		lines = []
 
-		if addressee == ADDRESSEE_ALL:
-			lines = self.getLines()
-		elif addressee == ADDRESSEE_CHILD_DIRECTED:
-			for l in self.getLines():
-				if l[LINE_ADDRESSEE] == SPEAKER_TARGET_CHILD:
-					lines.append(l)
-		elif addressee == ADDRESSEE_CHILD_PRODUCED:
-			for l in self.getLines():
-				if l[LINE_SPEAKER] == SPEAKER_TARGET_CHILD:
-					lines.append(l)
-		elif addressee == ADDRESSEE_OVER_HEARD:
-			for l in self.getLines():
-				if l[LINE_ADDRESSEE] != SPEAKER_TARGET_CHILD and l[LINE_SPEAKER] != SPEAKER_TARGET_CHILD :
-					lines.append(l)
+		if addressee != ADDRESSEE_ADULT: #adult isn't supported here
+			lines = self._getLinesByAddressee(addressee)
 		
 		tokens = []
 		for l in lines:
@@ -1082,6 +1375,11 @@ class ChaFile:
 				token += morUnit[MOR_UNIT_CATEGORIA] + "|" + morUnit[MOR_UNIT_LEXEMA] + morUnit[MOR_UNIT_EXTRA]
 			tokens.append(token)
 		
+		return tokens
+
+	def getLexicalDiversity(self, addressee=ADDRESSEE_ALL, metric=LEXICAL_DIVERSITY_HDD, extraParam = None):
+		tokens = self.getLexicalDiversityTokens(addressee)
+		
 		result = -1
 		if metric == LEXICAL_DIVERSITY_HDD:
 			result = ld.hdd(tokens)
@@ -1208,7 +1506,8 @@ class ChaFile:
 				qtyIntervencionChild = 0
 				qtyIntervencionOther = 0
 				
-				for l in self.getLines():
+				# a turn can't start before the first utterance of the speaker
+				for l in self.getLines()[ self._getFirstPosition(speaker) : ]:
 					if self.isUtteranceEmpty(l):
 						continue
 
@@ -1252,7 +1551,8 @@ class ChaFile:
 
 				qtyIntervencionOther = 0
 				
-				for l in self.getLines():
+				# a turn can't start before the first utterance of the speaker
+				for l in self.getLines()[ self._getFirstPosition(speaker) : ]:
 					if self.isUtteranceEmpty(l):
 						continue
 
@@ -1381,7 +1681,8 @@ class ChaFile:
 			lstMorUnit = []
 
 			if "^" in morUnit:
-				if lineNumber not in self.morAmbiguousLines:
+				if lineNumber not in self._morAmbiguousLines:
+					self._morAmbiguousLines.add(lineNumber)
 					self.morAmbiguousLines.append(lineNumber)
 				
 				lstMorUnit = morUnit.split("^")
@@ -1389,7 +1690,7 @@ class ChaFile:
 				lstMorUnit = lstMorUnit[1:]
 
 			parsedMorUnit = self._parseMorUnit(morUnit)
-			if parsedMorUnit != {}:
+			if parsedMorUnit is not None:
 				if len(lstMorUnit) > 0 :
 					parsedMorUnit[MOR_UNIT_AMBIGUOUS] = lstMorUnit
 
@@ -1404,14 +1705,12 @@ class ChaFile:
 			morUnit (string): One word as described by MOR
 
 		Returns:
-			dict: A dict representation of the MOR unit
+			MorUnit: The parsed MOR unit, None if it is skipped
 		"""
 		if morUnit in MOR_STOP_WORDS:
-			return {}
+			return None
 		
-		MOR_REGEX = r"([A-zÀ-ú:#\?']*)\|([A-zÀ-ú]*)(.*)"
-
-		matches = re.match(MOR_REGEX, morUnit)
+		matches = GRAMMAR.morUnit.match(morUnit)
 		if matches != None: #no agarra ni . ! ? 
 			if len(matches.groups()) == 3:
 				morCategoria = matches.group(1)
@@ -1422,30 +1721,30 @@ class ChaFile:
 					if type(stopWord) is list:
 						if morLexema == stopWord[1] and morCategoria == stopWord[0]:
 							if len(stopWord) == 2:
-								return {}
+								return None
 							else:
 								if stopWord[2] in morExtra:
-									return {}
+									return None
 					else:
 						if morLexema == stopWord:
-							return {}
+							return None
 
 				#reemplazo de palabras que está agarrando mal el MOR
 				if morLexema in MOR_REPLACEMENTS:
 					morLexema = MOR_REPLACEMENTS[morLexema]
 
-				parsedMorUnit = {
+				parsedMorUnit = MorUnit({
 					MOR_UNIT_CATEGORIA : morCategoria,
 					MOR_UNIT_LEXEMA : morLexema,
 					MOR_UNIT_EXTRA : morExtra
-				}
+				})
 
 				return parsedMorUnit
 			else:
 				log.log(f"Warning: Malformed mor unit \"{morUnit}\"")
-				return {}
+				return None
 		else:
-			return {}
+			return None
 
 	def _setAddressee(self, line):
 		"""Internal use. Set normalized addressee 
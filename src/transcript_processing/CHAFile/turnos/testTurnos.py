@@ -57,7 +57,7 @@ for s in uttsBySpeaker:
 
 turnos = cha.getTurns( ADDRESSEE_CHILD_DIRECTED )
 with open("testTurnosCDS.json", "w") as f:
-	json.dump(turnos, f)
+	json.dump(turnos, f, default=lambda utt: utt.toDict())
 
 print("")
 print("***")
@@ -71,7 +71,7 @@ turnos = cha.getTurns( ADDRESSEE_ADULT, True )
 for speaker in turnos:
 	turnos[speaker][:] = [ utts for utts in turnos[speaker] if len(utts) > 1 ]
 with open("testTurnosADS_intervening.json", "w") as f:
-	json.dump(turnos, f)
+	json.dump(turnos, f, default=lambda utt: utt.toDict())
 
 print("")
 print("***")
@@ -85,7 +85,7 @@ turnos = cha.getTurns( ADDRESSEE_ADULT, False )
 for speaker in turnos:
 	turnos[speaker][:] = [ utts for utts in turnos[speaker] if len(utts) > 1 ]
 with open("testTurnosADS_NON-intervening.json", "w") as f:
-	json.dump(turnos, f)
+	json.dump(turnos, f, default=lambda utt: utt.toDict())
 
 print("")
 print("***")
@@ -1,3 +1,20 @@
-from .talkbank_download import TalkBankDownloader
-from .talkbank_preprocess import talkbank_preprocess
-from .preprocess_talkbank_text import preprocess_talkbank_text
\ No newline at end of file
+import importlib
+
+from .preprocess_talkbank_text import preprocess_talkbank_text, normalize_many, set_row_cache
+from .row_cache import RowCache
+
+# imported on first use: they need the network and audio stacks (requests, pydub, soundfile...)
+# that text normalization (src.scoring...) doesn't
+_LAZY_ATTRIBUTES = {
+	"TalkBankDownloader": ".talkbank_download",
+	"talkbank_preprocess": ".talkbank_preprocess",
+}
+
+
+def __getattr__(name):
+	if name not in _LAZY_ATTRIBUTES:
+		raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+	value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+	# importing the submodule bound its name on the package, the function replaces it
+	globals()[name] = value
+	return value
@@ -0,0 +1,104 @@
+"""
+Audio decoding and WAV writing of talkbank_preprocess
+"""
+import numpy as np
+import soundfile as sf
+import soxr
+from pydub import AudioSegment
+
+
+class AudioBackend(object):
+
+	@staticmethod
+	def create(backend="auto"):
+		if backend == "auto":
+			return AutoBackend()
+		elif backend == "soundfile":
+			return SoundfileBackend()
+		elif backend == "pydub":
+			return PydubBackend()
+		else:
+			raise ValueError(f"cannot create audio backend of type {backend}")
+
+
+class BaseAudioBackend(object):
+	"""
+	Contract shared by every backend returned by AudioBackend.create.
+	Audio is a numpy array of integer samples (channels x samples).
+	"""
+
+	def load(self, path, sampling_rate):
+		"""
+		Decode a file and resample it
+		Args:
+			path (str): audio file
+			sampling_rate (int): sampling rate of the returned samples
+		Return:
+			samples (np.ndarray): channels x samples
+			sample_width (int): bytes per sample
+		"""
+		raise NotImplementedError
+
+	def write_wav(self, path, samples, sampling_rate, sample_width):
+		"""
+		Args:
+			path (str): wav file
+			samples (np.ndarray): mono samples
+			sampling_rate (int): sampling rate of samples
+			sample_width (int): bytes per sample
+		"""
+		raise NotImplementedError
+
+
+class SoundfileBackend(BaseAudioBackend):
+	"""
+	One decode with libsndfile, resampled by soxr (same resampler as dataset_utils.decode_audio).
+	24 and 32 bit sources are kept at full width as 32 bit samples, like pydub does,
+	float sources are read as 32 bit samples and every other format (mp3, 8 bit...) as 16 bit samples.
+	"""
+	SUBTYPES = {2: "PCM_16", 4: "PCM_32"}
+	WIDE_SUBTYPES = {"PCM_24", "PCM_32", "FLOAT", "DOUBLE"}
+
+	def load(self, path, sampling_rate):
+		sample_width = 4 if sf.info(path).subtype in self.WIDE_SUBTYPES else 2
+		samples, sr = sf.read(path, dtype=f"int{8 * sample_width}", always_2d=True)
+		if sr != sampling_rate:
+			samples = soxr.resample(samples, sr, sampling_rate, quality="HQ")
+		return samples.T, sample_width
+
+	def write_wav(self, path, samples, sampling_rate, sample_width):
+		if sample_width not in self.SUBTYPES:
+			# 8 bit samples (from pydub) are written as 16 bit
+			samples, sample_width = samples.astype(np.int16) * 256, 2
+		# the samples buffer is handed to libsndfile as is
+		sf.write(path, samples, sampling_rate, subtype=self.SUBTYPES[sample_width], format="WAV")
+
+
+class PydubBackend(BaseAudioBackend):
+	"""
+	Decoding through ffmpeg for the formats unknown to libsndfile (mp4...),
+	resampling with audioop.ratecv
+	"""
+
+	def load(self, path, sampling_rate):
+		audio = AudioSegment.from_file(path)
+		audio = audio.set_frame_rate(sampling_rate)
+		samples = np.array(audio.get_array_of_samples()).reshape(-1, audio.channels).T
+		return samples, audio.sample_width
+
+	def write_wav(self, path, samples, sampling_rate, sample_width):
+		audio = AudioSegment(np.ascontiguousarray(samples).tobytes(), sample_width=sample_width,
+			frame_rate=sampling_rate, channels=1)
+		audio.export(path, format="wav")
+
+
+class AutoBackend(SoundfileBackend):
+	"""
+	SoundfileBackend, files that libsndfile can't decode go through PydubBackend
+	"""
+
+	def load(self, path, sampling_rate):
+		try:
+			return super().load(path, sampling_rate)
+		except sf.LibsndfileError:
+			return PydubBackend().load(path, sampling_rate)
@@ -3,6 +3,25 @@ MANUAL https://talkbank.org/manuals/CHAT.html
 """
 from unidecode import unidecode
 from .utils_preprocess import *
+from .row_cache import RowCache
+
+
+SPECIAL_UTTERANCE_TERMINATORS = [
+	"+…", # Trailing Off
+	"+..?", # Trailing Off of a Question
+	"+!?", # Question With Exclamation
+	"+/.", # Interruption
+	"+/?", # Interruption of a Question
+	"+//.", # Self-Interruption
+	"+//?", # Self-Interrupted Question
+	"+.", # Transcription Break
+	'+"/.', # Quotation Follows
+	'+".', # Quotation Precedes
+	'+"', # Quoted Utterance
+	"+^", # Quick Uptake
+	"+,", # Self Completion
+	"++", # Other Completion
+]
 
 
 def remove_special_utterance_terminators(text, replace=" "):
@@ -14,23 +33,7 @@ def remove_special_utterance_terminators(text, replace=" "):
 	These special terminators all begin with the + symbol and end with
 	one of the three basic utterance terminators.
 	"""
-	special_utterance_terminators = [
-		"+…", # Trailing Off
-		"+..?", # Trailing Off of a Question
-		"+!?", # Question With Exclamation
-		"+/.", # Interruption
-		"+/?", # Interruption of a Question
-		"+//.", # Self-Interruption
-		"+//?", # Self-Interrupted Question
-		"+.", # Transcription Break
-		'+"/.', # Quotation Follows
-		'+".', # Quotation Precedes
-		'+"', # Quoted Utterance
-		"+^", # Quick Uptake
-		"+,", # Self Completion
-		"++", # Other Completion
-	]
-	text = regex_replace_substr(text, special_utterance_terminators, replace=replace)
+	text = regex_replace_substr(text, SPECIAL_UTTERANCE_TERMINATORS, replace=replace)
 	return text
 
 
@@ -49,6 +52,44 @@ for k in NEW_TAGS:
 	NEW_TAGS[k] = " " + NEW_TAGS[k] + " "
 
 
+# Substring rules of preprocess_row, compiled once at import instead of on every line.
+# Consecutive rules are merged into one pass when their order doesn't change the result.
+RULES = {
+	# remove special utterance
+	"special-utterance-terminator": SubstrReplacer(SPECIAL_UTTERANCE_TERMINATORS, NEW_TAGS["special-utterance-terminator"]),
+	# remove special characters and delimiters: no special character contains a delimiter,
+	# a "\x01r" made by removing delimiters ("\x01:r") is caught by the next repetition
+	"delimiter-special-character": SubstrReplacer.merge(
+		(["⌊", "⌋", "⌈", "⌉", ":"], ""),
+		([
+			# special characters
+			"↗", "→", "°", "≈", "↓", "⁎", "↓", "↑",
+			"\x02", "\x01r", "≠", "↫", "↘", "↗", "☺",
+			# CHAT specific delimiters
+			"<", ">", "^",
+		], NEW_TAGS["special-character"]),
+	),
+	# remove specific pattern from annotator
+	"annotator": SubstrReplacer([" ∙h "], " "),
+	# remove CHAT specific delimiters that we needed before
+	"chat-delimiter": SubstrReplacer(["+", "*", "~", "=", "(", ")", "∙"], ""),
+	# remove @1 when speaker spelling each letter of a word
+	"spelling": SubstrReplacer(["@1 ", "@l ", "@1", "@l"], ""),
+	# remove multiple hhh for laugh, non verbal expressions and unintelligible: whole words
+	# replaced by a tag between spaces, no rule can create or hide a match of another one
+	"spoken": SubstrReplacer.merge(
+		([" " + "h" * i + " " for i in range(2, 7)], NEW_TAGS["laugh"]),
+		([" " + r + " " for r in [
+			"mhh", "mhm", "mh", "hm", "um",
+			"umph", "euhm",
+			"uhuh", "uhu", "huh", "uh",
+		]], NEW_TAGS["non-verbal"]),
+		([" xxx "], NEW_TAGS["unintelligible"]),
+	),
+	"tags": SubstrReplacer(NEW_TAGS.values(), " "),
+}
+
+
 def preprocess_row(text,
 	remove_tags=False,
 	remove_beg_unfinished_word=False,
@@ -57,24 +98,13 @@ def preprocess_row(text,
 	my_specific_delimiter = "✌️" # can be any character that is not in the original text
 
 	# remove special utterance
-	text = remove_special_utterance_terminators(text, replace=NEW_TAGS["special-utterance-terminator"])
+	text = RULES["special-utterance-terminator"](text)
 
 	# clean space for preprocess
 	text = space_text_for_preprocess(text)
 
 	# remove special characters and delimiters
-	remove_list = ["⌊", "⌋", "⌈", "⌉", ":"]
-	text = regex_replace_substr(text, remove_list, replace="")
-
-	# remove special characters and delimiters
-	remove_list = [
-		# special characters
-		"↗", "→", "°", "≈", "↓", "⁎", "↓", "↑",
-		"\x02", "\x01r", "≠", "↫", "↘", "↗", "☺",
-		# CHAT specific delimiters
-		"<", ">", "^",
-	]
-	text = regex_replace_substr(text, remove_list, replace=NEW_TAGS["special-character"])
+	text = RULES["delimiter-special-character"](text)
 
 	# remove pauses (0.5) and (...)
 	text = regex_replace_pattern(text, "(", ")", replace=NEW_TAGS["pause"], exclude_if_contains_alpha=True)
@@ -97,40 +127,18 @@ def preprocess_row(text,
 	text = replace_text_after(text, "&{n=*", specific_end="&}n=*")
 
 	# remove specific pattern from annotator
-	remove_list = [" ∙h "]
-	text = regex_replace_substr(text, remove_list, replace=" ")
+	text = RULES["annotator"](text)
 
 	if remove_beg_unfinished_word:
 		# remove solo or duo char with "-" ex: " j- ", " i- ", " me- "
 		text = regex_replace_pattern(text, " ", "- ", replace=" ", max_alpha_char=2)
 
-	# remove CHAT specific delimiters that we needed before
-	remove_list = ["+", "*", "~", "=", "(", ")", "∙"]
-	text = regex_replace_substr(text, remove_list, replace="")
-
-	# remove @1 when speaker spelling each letter of a word
-	remove_list = ["@1 ", "@l ", "@1", "@l"]
-	text = regex_replace_substr(text, remove_list, replace="")
-
-	# remove multiple hhh for laugh
-	remove_list = [" " + "h" * i + " " for i in range(2, 7)]
-	text = regex_replace_substr(text, remove_list, replace=NEW_TAGS["laugh"])
-
-	# remove non verbal expressions
-	remove_list = [
-		"mhh", "mhm", "mh", "hm", "um",
-		"umph", "euhm",
-		"uhuh", "uhu", "huh", "uh",
-	]
-	remove_list = [" " + r + " " for r in remove_list]
-	text = regex_replace_substr(text, remove_list, replace=NEW_TAGS["non-verbal"])
-
-	# remove unintelligible
-	remove_list = [" xxx "]
-	text = regex_replace_substr(text, remove_list, replace=NEW_TAGS["unintelligible"])
+	# remove CHAT specific delimiters, @1 spelling, laughs, non verbal expressions and unintelligible
+	for rule in ["chat-delimiter", "spelling", "spoken"]:
+		text = RULES[rule](text)
 
 	if remove_tags:
-		text = regex_replace_substr(text, NEW_TAGS.values(), replace=" ")
+		text = RULES["tags"](text)
 
 	if lower:
 		text = text.lower()
@@ -142,10 +150,45 @@ def preprocess_row(text,
 	return text
 
 
+ROW_OPTIONS = ("remove_tags", "remove_beg_unfinished_word", "lower", "remove_accents")
+
+# cache of the results of preprocess_row, off until set_row_cache is called
+ROW_CACHE = None
+
+
+def set_row_cache(cache):
+	"""
+	Replace the cache used by preprocess_talkbank_text
+	Args:
+		cache (RowCache): ex: RowCache(maxsize=10**6, path="rows.sqlite"), None to disable caching
+	Return:
+		previous cache
+	"""
+	global ROW_CACHE
+	previous = ROW_CACHE
+	ROW_CACHE = cache
+	return previous
+
+
+def preprocess_row_cached(text, **kwargs):
+	"""
+	preprocess_row through ROW_CACHE, keyed on the line and the ROW_OPTIONS flags
+	"""
+	cache = ROW_CACHE
+	if cache is None or any(k not in ROW_OPTIONS for k in kwargs):
+		return preprocess_row(text, **kwargs)
+	options = tuple(bool(kwargs.get(o, False)) for o in ROW_OPTIONS)
+	result = cache.get(text, options)
+	if result is None:
+		result = preprocess_row(text, **kwargs)
+		cache.set(text, options, result)
+	return result
+
+
 def preprocess_talkbank_text(text, **kwargs):
 	text = str(text)
 	text = text.split("\n")
-	text = [preprocess_row(t, **kwargs) for t in text]
+	text = [preprocess_row_cached(t, **kwargs) for t in text]
 	text = [t for t in text if len(t) > 0]
 	text = "\n".join(text)
 	if not text:
@@ -153,11 +196,72 @@ def preprocess_talkbank_text(text, **kwargs):
 	return text
 
 
-def apply_preprocess_talkbank_text(path="raw_pred.csv", col="true", ncol="preprocess_true"):
+def _preprocess_chunk(args):
+	texts, kwargs = args
+	return [preprocess_talkbank_text(t, **kwargs) for t in texts]
+
+
+def _preprocess_chunk_worker(args):
+	"""
+	_preprocess_chunk in a pool process: the pending sqlite writes are flushed before
+	returning, as a pool process exits without closing its cache
+	Return:
+		normalized (list str)
+		stats (dict): hits, disk_hits and misses of the chunk, None without cache
+	"""
+	cache = ROW_CACHE
+	if cache is None:
+		return _preprocess_chunk(args), None
+	before = cache.stats()
+	normalized = _preprocess_chunk(args)
+	cache.flush()
+	after = cache.stats()
+	return normalized, {k: after[k] - before[k] for k in ("hits", "disk_hits", "misses")}
+
+
+def normalize_many(texts, n_jobs=1, chunksize=1000, **kwargs):
+	"""
+	preprocess_talkbank_text over many texts
+	Identical texts (fillers, backchannels...) are normalized once, the distinct
+	texts are split into chunks processed by a pool of n_jobs processes.
+	Args:
+		texts (iterable or pd.Series): raw texts
+		n_jobs (int): number of processes, 1 runs in the current process
+		chunksize (int): distinct texts sent to a process at once
+		kwargs: options of preprocess_row (remove_tags, lower...)
+	Return:
+		normalized (pd.Series): aligned with texts, with its index when it is a Series
+	"""
+	import numpy as np
+	import pandas as pd
+	from concurrent.futures import ProcessPoolExecutor
+
+	if not isinstance(texts, pd.Series):
+		texts = pd.Series(list(texts), dtype=object)
+	codes, unique = pd.factorize(texts, use_na_sentinel=False)
+	chunks = [(unique[i:i + chunksize], kwargs) for i in range(0, len(unique), chunksize)]
+	if n_jobs == 1 or len(chunks) <= 1:
+		results = map(_preprocess_chunk, chunks)
+		normalized = [t for chunk in results for t in chunk]
+	else:
+		normalized = []
+		# the cache is handed to each process instead of being inherited through fork:
+		# a sqlite connection is never shared and spawned processes get it too
+		with ProcessPoolExecutor(max_workers=n_jobs, initializer=set_row_cache, initargs=(ROW_CACHE,)) as executor:
+			for chunk, stats in executor.map(_preprocess_chunk_worker, chunks):
+				normalized.extend(chunk)
+				# lookups of the pool processes are counted in the cache of this process
+				if stats is not None and ROW_CACHE is not None:
+					ROW_CACHE.add_stats(**stats)
+	normalized = np.array(normalized, dtype=object)
+	return pd.Series(normalized[codes], index=texts.index, name=texts.name, dtype=object)
+
+
+def apply_preprocess_talkbank_text(path="raw_pred.csv", col="true", ncol="preprocess_true", n_jobs=1):
 	import pandas as pd
 
 	df = pd.read_csv(path, encoding="utf-8")
-	df[ncol] = df[col].apply(lambda x: preprocess_talkbank_text(x, remove_tags=True, remove_beg_unfinished_word=True, lower=True, remove_accents=True))
+	df[ncol] = normalize_many(df[col], n_jobs=n_jobs, remove_tags=True, remove_beg_unfinished_word=True, lower=True, remove_accents=True)
 	df.to_csv(path, index=False, encoding="utf-8")
 	text = df[col][203]
 	ntext = df[ncol][203]
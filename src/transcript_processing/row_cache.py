@@ -0,0 +1,141 @@
+"""
+Cache of preprocess_row results, see preprocess_talkbank_text.ROW_CACHE
+"""
+import os
+import sqlite3
+from collections import OrderedDict
+
+
+class RowCache(object):
+	"""
+	Bounded LRU cache keyed on a raw line and the preprocess_row options,
+	optionally backed by a sqlite file shared between runs.
+	Each process has its own memory tier (and sqlite connection), the statistics of
+	the lookups made in pool processes by normalize_many are added to the parent ones.
+	"""
+	def __init__(self, maxsize=2**16, path=None, flush_every=1000):
+		"""
+		Args:
+			maxsize (int): number of lines kept in memory
+			path (str): sqlite file of the persistent tier, None to keep the cache in memory only
+			flush_every (int): new results written to sqlite at once
+		"""
+		self.maxsize = maxsize
+		self.path = path
+		self.flush_every = flush_every
+		self._entries = OrderedDict()
+		self._pending = []
+		self._db = None
+		self._pid = None
+		self.hits = 0
+		self.disk_hits = 0
+		self.misses = 0
+
+	def __getstate__(self):
+		# a pickled cache (sent to a pool process) keeps its settings only,
+		# the copy starts empty and opens its own sqlite connection
+		state = self.__dict__.copy()
+		state.update(_entries=OrderedDict(), _pending=[], _db=None, _pid=None, hits=0, disk_hits=0, misses=0)
+		return state
+
+	def __len__(self):
+		return len(self._entries)
+
+	def _connection(self):
+		# a connection inherited through fork (process pools) is not reused
+		if self._db is None or self._pid != os.getpid():
+			self._db = sqlite3.connect(self.path, timeout=60)
+			self._db.execute("PRAGMA journal_mode=WAL")
+			self._db.execute("CREATE TABLE IF NOT EXISTS rows ("
+				"line TEXT, options TEXT, result TEXT, PRIMARY KEY (line, options))")
+			self._pid = os.getpid()
+			self._pending = []
+		return self._db
+
+	@staticmethod
+	def _options_key(options):
+		return "".join("1" if o else "0" for o in options)
+
+	def get(self, line, options):
+		"""
+		Args:
+			line (str): raw line
+			options (tuple bool): preprocess_row options
+		Return:
+			result (str) or None if the line was never cached
+		"""
+		key = (line, options)
+		result = self._entries.get(key)
+		if result is not None:
+			self._entries.move_to_end(key)
+			self.hits += 1
+			return result
+		if self.path is not None:
+			row = self._connection().execute("SELECT result FROM rows WHERE line = ? AND options = ?",
+				(line, self._options_key(options))).fetchone()
+			if row is not None:
+				self.disk_hits += 1
+				self._remember(key, row[0])
+				return row[0]
+		self.misses += 1
+		return None
+
+	def set(self, line, options, result):
+		self._remember((line, options), result)
+		if self.path is not None:
+			self._connection()
+			self._pending.append((line, self._options_key(options), result))
+			if len(self._pending) >= self.flush_every:
+				self.flush()
+
+	def _remember(self, key, result):
+		self._entries[key] = result
+		self._entries.move_to_end(key)
+		while len(self._entries) > self.maxsize:
+			self._entries.popitem(last=False)
+
+	def flush(self):
+		"""
+		Write the pending results into the sqlite tier
+		"""
+		if self._pending and self._db is not None and self._pid == os.getpid():
+			self._db.executemany("INSERT OR REPLACE INTO rows VALUES (?, ?, ?)", self._pending)
+			self._db.commit()
+		self._pending = []
+
+	def close(self):
+		self.flush()
+		if self._db is not None and self._pid == os.getpid():
+			self._db.close()
+		self._db = None
+
+	def clear(self):
+		"""
+		Empty the memory tier and reset the statistics, the sqlite file is kept
+		"""
+		self._entries.clear()
+		self.hits = 0
+		self.disk_hits = 0
+		self.misses = 0
+
+	def add_stats(self, hits=0, disk_hits=0, misses=0):
+		"""
+		Count lookups made by other processes, see normalize_many
+		"""
+		self.hits += hits
+		self.disk_hits += disk_hits
+		self.misses += misses
+
+	def stats(self):
+		"""
+		Return:
+			stats (dict): hits (memory), disk_hits (sqlite), misses, hit_rate and size (lines in memory)
+		"""
+		lookups = self.hits + self.disk_hits + self.misses
+		return {
+			"hits": self.hits,
+			"disk_hits": self.disk_hits,
+			"misses": self.misses,
+			"hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+			"size": len(self._entries),
+		}
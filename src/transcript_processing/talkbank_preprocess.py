@@ -1,12 +1,13 @@
 import os
 import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
-from pydub import AudioSegment
 from rich.progress import track
 import numpy as np
 
 from .CHAFile.ChaFile import *
-from .preprocess_talkbank_text import preprocess_talkbank_text
+from .preprocess_talkbank_text import normalize_many
+from .audio_backend import AudioBackend
 
 
 def get_files_path(directory):
@@ -46,27 +47,125 @@ def match_audio_transcription(files_path):
 	return df
 
 
-def preprocess_data(name, audio_path, transcript_path, output_dir=None, sampling_rate=16000, timestamps_pad=100, max_silence=1000, min_segment=300, min_audio=3000, overwrite=True):
+def assemble_track(samples, turns, sampling_rate):
+	"""
+	Concatenate the turns of a speaker, each one preceded by some silence, into one mono track.
+	Every turn is copied once into a preallocated buffer.
+	Args:
+		samples (np.ndarray): samples of the channel of the speaker
+		turns (list): (silence_ms, start_ms, end_ms) of each turn, silence_ms is inserted before the turn
+		sampling_rate (int): sampling rate of samples
+	Return:
+		track (np.ndarray): samples of the track
+	"""
+	# positions are converted to frames as AudioSegment slicing does, a turn ending
+	# after the last sample is padded with silence
+	length_ms = round(1000 * len(samples) / sampling_rate)
+	to_frame = lambda ms: int(min(ms, length_ms) * sampling_rate / 1000.0)
+	bounds = [(max(0, int(silence_ms * sampling_rate / 1000.0)), to_frame(start_ms), to_frame(end_ms))
+		for silence_ms, start_ms, end_ms in turns]
+
+	track = np.zeros(sum(silence + end - start for silence, start, end in bounds), dtype=samples.dtype)
+	position = 0
+	for silence, start, end in bounds:
+		position += silence
+		chunk = samples[start:end]
+		track[position:position + len(chunk)] = chunk
+		position += end - start
+	return track
+
+
+def cumulative_energy(samples, positions, block_size=2**14):
+	"""
+	Sum of the squared samples of each channel before each position. The cumulative sum is
+	computed block by block: blocks fit in cache and the cumulative sum of a whole recording
+	is never held in memory.
+	Args:
+		samples (np.ndarray): channels x samples
+		positions (np.ndarray): frames, clipped to the number of samples
+		block_size (int): samples squared and summed at once
+	Return:
+		energy (np.ndarray): channels x positions
+	"""
+	# squares of up to 16 bit samples fit in int32 and their sums in int64, which is exact
+	if samples.dtype.itemsize <= 2:
+		square_dtype, sum_dtype = np.int32, np.int64
+	else:
+		square_dtype = sum_dtype = np.float64
+	length = samples.shape[1]
+	positions = np.minimum(positions, length)
+	order = np.argsort(positions, kind="stable")
+	sorted_positions = positions[order]
+
+	energy = np.zeros((samples.shape[0], len(positions)), dtype=sum_dtype)
+	total = np.zeros((samples.shape[0], 1), dtype=sum_dtype)
+	first = np.searchsorted(sorted_positions, 0, side="right")
+	for low in range(0, length, block_size):
+		high = min(low + block_size, length)
+		block = samples[:, low:high].astype(square_dtype)
+		np.multiply(block, block, out=block)
+		last = np.searchsorted(sorted_positions, high, side="right")
+		if first == last:
+			# no position in this block, only its total is needed
+			total += block.sum(axis=1, dtype=sum_dtype, keepdims=True)
+			continue
+		cumsum = np.cumsum(block, axis=1, dtype=sum_dtype)
+		energy[:, order[first:last]] = cumsum[:, sorted_positions[first:last] - low - 1] + total
+		total += cumsum[:, -1:]
+		first = last
+	return energy
+
+
+def channel_rms(samples, intervals, sampling_rate):
+	"""
+	RMS of every channel over each interval, equal to AudioSegment.rms of the slices
+	audio[start_ms:end_ms] of each mono channel, from cumulative sums of squared samples.
+	Args:
+		samples (np.ndarray): channels x samples
+		intervals (np.ndarray): n x 2, start_ms and end_ms
+		sampling_rate (int): sampling rate of samples
+	Return:
+		rms (np.ndarray): n x channels
+	"""
+	intervals = np.asarray(intervals, dtype=np.float64).reshape(-1, 2)
+	# frames as in AudioSegment slicing, the frames missing at the end count as silence
+	length_ms = round(1000 * samples.shape[1] / sampling_rate)
+	frames = (np.minimum(intervals, length_ms) * sampling_rate / 1000.0).astype(np.int64)
+	starts, ends = frames[:, 0], frames[:, 1]
+	counts = np.maximum(ends - starts, 0)
+
+	energy = cumulative_energy(samples, np.concatenate([starts, ends]))
+	energy = (energy[:, len(starts):] - energy[:, :len(starts)]).astype(np.float64)
+	energy[:, counts == 0] = 0
+	# audioop.rms truncates to an integer
+	return np.floor(np.sqrt(energy / np.maximum(counts, 1))).T
+
+
+def preprocess_data(name, audio_path, transcript_path, output_dir=None, sampling_rate=16000, timestamps_pad=100, max_silence=1000, min_segment=300, min_audio=3000, overwrite=True, backend="auto"):
+	"""
+	Split one recording and its transcription by speaker, see talkbank_preprocess
+	backend: "auto" (soundfile, pydub for the formats libsndfile can't decode), "soundfile" or "pydub"
+	Return:
+		speaker_channels (dict): channel of the recording kept for each speaker
+	"""
 	if not os.path.isdir(output_dir):
 		os.makedirs(output_dir)
 
-	audio = AudioSegment.from_file(audio_path)
-	audio = audio.set_frame_rate(sampling_rate)
-	if audio.channels == 2:
-		split_audios = audio.split_to_mono()
-		audios = [split_audios[0], split_audios[1]]
-	elif audio.channels == 1:
-		audios = [audio]
-	else:
-		raise ValueError(f"More than 2 channels audio not implemented yet.\nName: {name}\nNb channels: {audio.channels}")
+	audio_backend = AudioBackend.create(backend)
+	# channels x samples
+	samples, sample_width = audio_backend.load(audio_path, sampling_rate)
+	if samples.shape[0] not in (1, 2):
+		raise ValueError(f"More than 2 channels audio not implemented yet.\nName: {name}\nNb channels: {samples.shape[0]}")
+	duration_ms = 1000 * samples.shape[1] / sampling_rate
 
-	cha = ChaFile(transcript_path)
-	lines = cha.getLines()
+	# utterances are paired with the audio while the transcript is parsed
+	cha = ChaFile(transcript_path, stream=True)
 
 	# split by speaker
 	speaker_data = {}
-	speaker_channels = {}
-	for line in lines:
+	bullet_speakers = []
+	bullet_intervals = []
+	for line in cha.iterLines():
 		if "bullet" not in line:
 			continue
 		speaker = line["hablante"]
@@ -75,55 +174,58 @@ def preprocess_data(name, audio_path, transcript_path, output_dir=None, sampling
 		start, end = timestamps[0], timestamps[1]
 		if speaker not in speaker_data:
 			speaker_data[speaker] = []
-			speaker_channels[speaker] = []
 		if len(speaker_data[speaker]) > 0 and start - speaker_data[speaker][-1]["end"] <= timestamps_pad * 3:
 			speaker_data[speaker][-1]["end"] = end
 			speaker_data[speaker][-1]["text"] += "\n" + text
 		else:
 			speaker_data[speaker].append({"start": start, "end": end, "text": text})
 
-		# detect the good channel for each speaker
-		values = []
-		for a in audios:
-			values.append(a[start:end].dBFS)
-		speaker_channels[speaker].append(np.argmax(values))
+		bullet_speakers.append(speaker)
+		bullet_intervals.append((start, end))
 
-	for k in speaker_channels:
-		speaker_channels[k] = round(np.mean(speaker_channels[k]))
+	# detect the good channel for each speaker: the loudest channel of each bullet, averaged by speaker
+	speaker_channels = {}
+	if len(bullet_speakers) > 0:
+		loudest = channel_rms(samples, bullet_intervals, sampling_rate).argmax(axis=1)
+		speakers, codes = np.unique(bullet_speakers, return_inverse=True)
+		means = np.bincount(codes, weights=loudest) / np.bincount(codes)
+		speaker_channels = dict(zip(speakers.tolist(), np.round(means).astype(int).tolist()))
 
 	# generate new .wav files and .csv
 	for speaker, turns in speaker_data.items():
 		wav_path = os.path.join(output_dir, name + "_" + speaker + ".wav")
 		csv_path = os.path.join(output_dir, name + "_" + speaker + ".csv")
-		speaker_audio = AudioSegment.empty()
+		track_turns = []
 		df_speaker = []
 		prev_end = 0
 		cut = 0
 		for row in turns:
 			start = int(max(0, row["start"] - timestamps_pad))
-			end = int(min(audio.duration_seconds * 1000, row["end"] + timestamps_pad))
+			end = int(min(duration_ms, row["end"] + timestamps_pad))
 			text = row["text"]
 			if end - start < min_segment:
 				continue
+			silence_duration = 0
 			if len(df_speaker) > 0:
 				silence_duration = min(max_silence, start - prev_end)
-				speaker_audio += AudioSegment.silent(duration=silence_duration)
 				cut -= silence_duration
-			speaker_audio += audios[speaker_channels[speaker]][start:end]
+			track_turns.append((silence_duration, start, end))
 			cut += start - prev_end
 			prev_end = end
 			df_speaker.append({"start_ms": start - cut, "end_ms": end - cut, "text": text})
-		if speaker_audio.duration_seconds < min_audio / 1000:
+		speaker_audio = assemble_track(samples[speaker_channels[speaker]], track_turns, sampling_rate)
+		if len(speaker_audio) / sampling_rate < min_audio / 1000:
 			continue
 		if overwrite or not os.path.isfile(wav_path):
-			speaker_audio.export(wav_path, format="wav")
+			audio_backend.write_wav(wav_path, speaker_audio, sampling_rate, sample_width)
 		df_speaker = pd.DataFrame(data=df_speaker)
-		df_speaker["preprocess_text"] = df_speaker["text"].apply(lambda x: preprocess_talkbank_text(x, remove_tags=True))
+		df_speaker["preprocess_text"] = normalize_many(df_speaker["text"], remove_tags=True)
 		if overwrite or not os.path.isfile(csv_path):
 			df_speaker.to_csv(csv_path, index=False, encoding="utf-8")
+	return speaker_channels
 
 
-def talkbank_preprocess(original_dir, output_dir=None, sampling_rate=16000, overwrite=True):
+def talkbank_preprocess(original_dir, output_dir=None, sampling_rate=16000, overwrite=True, n_jobs=1, backend="auto"):
 	"""
 	Select a directory containing .cha and .mp3 files downloaded on https://www.talkbank.org/
 	It will preprocess audio:
@@ -132,6 +234,9 @@ def talkbank_preprocess(original_dir, output_dir=None, sampling_rate=16000, over
 		- set sampling rate
 		- set mono channel
 		- replace everything else than speech by silence
+	Recordings are independent, with n_jobs > 1 they are preprocessed by a pool of n_jobs processes.
+	A recording that fails doesn't stop the others, failures are written to preprocess_errors.csv in output_dir.
+	Audio is decoded and written by backend, see preprocess_data.
 	"""
 	if output_dir is None:
 		output_dir = "preprocess_" + original_dir
@@ -140,9 +245,35 @@ def talkbank_preprocess(original_dir, output_dir=None, sampling_rate=16000, over
 	print("Saving preprocess data into directory:", output_dir)
 	files_path = get_files_path(original_dir)
 	df = match_audio_transcription(files_path)
-	for i in track(df.index, description=f"[cyan]Preprocessing {original_dir}"):
-		preprocess_data(df["name"][i], df["audio"][i], df["transcript"][i], output_dir=output_dir,
-			sampling_rate=sampling_rate, overwrite=overwrite)
+	description = f"[cyan]Preprocessing {original_dir}"
+	errors = []
+
+	def add_error(i, e):
+		errors.append({"name": df["name"][i], "audio": df["audio"][i], "transcript": df["transcript"][i],
+			"error": f"{type(e).__name__}: {e}"})
+
+	if n_jobs == 1:
+		for i in track(df.index, description=description):
+			try:
+				preprocess_data(df["name"][i], df["audio"][i], df["transcript"][i], output_dir=output_dir,
+					sampling_rate=sampling_rate, overwrite=overwrite, backend=backend)
+			except Exception as e:
+				add_error(i, e)
+	else:
+		with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+			futures = {executor.submit(preprocess_data, df["name"][i], df["audio"][i], df["transcript"][i],
+				output_dir=output_dir, sampling_rate=sampling_rate, overwrite=overwrite, backend=backend): i for i in df.index}
+			for future in track(as_completed(futures), total=len(futures), description=description):
+				if future.exception() is not None:
+					add_error(futures[future], future.exception())
+
+	errors_path = os.path.join(output_dir, "preprocess_errors.csv")
+	if len(errors) > 0:
+		errors = pd.DataFrame(errors).sort_values("name")
+		errors.to_csv(errors_path, index=False, encoding="utf-8")
+		print(f"{len(errors)}/{len(df)} recordings failed, see {errors_path}")
+	elif os.path.isfile(errors_path):
+		os.remove(errors_path)
 	return output_dir
 
 
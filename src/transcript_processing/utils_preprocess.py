@@ -1,3 +1,4 @@
+import functools
 import re
 import string
 
@@ -25,18 +26,59 @@ def replace_text_after(text, after, break_chars="  !.,;" + chr(32), specific_end
 	Args:
 		specific_end (str): if specified, stop the remove only if the specific end is found
 	Warning: The text replaced can be a small smegment or the entire text if the break_chars are not well chosen
+	The markers are replaced from the last one to the first one, a marker reaching the next one
+	before any break stops in the replacement of the next one.
+	This is done in a single left to right scan, unless a replacement could form a new marker.
 	"""
-	if after in text:
-		while after in text:
-			position = text.rindex(after)
-			i = position
-			while i < len(text):
-				if specific_end is not None and text[i:].startswith(specific_end):
-					break
-				elif specific_end is None and text[i] in break_chars:
-					break
-				i += 1
-			text = text[:position] + replace + text[i:]
+	if after not in text:
+		return text
+	if not replace or (specific_end is None and not break_chars) or specific_end == ""\
+	or set(replace) & set(after + (specific_end or "")) or _overlaps_itself(after):
+		return _replace_text_after_iterative(text, after, break_chars, specific_end, replace)
+
+	if specific_end is None:
+		breaks = re.compile("[" + re.escape(break_chars) + "]")
+		# scan of a marker reaching the next one, stopped in its replacement
+		chained = next((replace[j:] for j, c in enumerate(replace) if c in break_chars), "")
+	else:
+		chained = ""
+
+	parts = []
+	last = 0
+	reached = False
+	position = text.find(after)
+	while position >= 0:
+		parts.append(text[last:position])
+		parts.append(chained if reached else replace)
+		next_position = text.find(after, position + 1)
+		end = next_position if next_position >= 0 else len(text)
+		if specific_end is None:
+			match = breaks.search(text, position, end)
+			i = match.start() if match is not None else -1
+		else:
+			i = text.find(specific_end, position, end)
+		reached = i < 0 and next_position >= 0
+		last = i if i >= 0 else end
+		position = next_position
+	parts.append(text[last:])
+	return "".join(parts)
+
+
+def _overlaps_itself(s):
+	return any(s[:k] == s[-k:] for k in range(1, len(s)))
+
+
+def _replace_text_after_iterative(text, after, break_chars, specific_end, replace):
+	while after in text:
+		position = text.rindex(after)
+		i = position
+		while i < len(text):
+			if specific_end is not None and text[i:].startswith(specific_end):
+				break
+			elif specific_end is None and text[i] in break_chars:
+				break
+			i += 1
+		text = text[:position] + replace + text[i:]
 	return text
 
 
@@ -44,7 +86,121 @@ def regex_replace_pattern(text, start, end, replace="",
 	only_num=False, exclude_if_contains_alpha=False, max_alpha_char=None):
 	"""
 	Replace a substring starting with 'start' and ending with 'end'
+	Only the innermost substrings are replaced, until the remaining ones are all skipped by
+	only_num, exclude_if_contains_alpha or max_alpha_char.
+	Single character delimiters, ex: "(" ")", are matched with a stack in one scan, and
+	unfinished words, ex: " " "- ", are handled on the space separated tokens of the text.
+	"""
+	options = (start, end, only_num, exclude_if_contains_alpha, max_alpha_char)
+	if start + end in text:
+		# empty pairs are only replaced when a longer match contains them
+		return _regex_replace_pattern_iterative(text, replace, *options)
+	if len(start) == 1 and len(end) == 1 and start != end\
+	and not start.isalnum() and not end.isalnum()\
+	and replace and start not in replace and end not in replace:
+		return _replace_innermost_pairs(text, replace, *options)
+	if start == " " and len(end) == 2 and end[1] == " " and end[0] not in " \n"\
+	and not end[0].isalnum() and replace == " ":
+		return _replace_space_delimited(text, *options)
+	return _regex_replace_pattern_iterative(text, replace, *options)
+
+
+def _skip_pattern(p, start, end, only_num, exclude_if_contains_alpha, max_alpha_char):
+	if only_num:
+		tmp = p.replace(start, "").replace(end, "").replace(",", ".").replace(" ", "")
+		try:
+			tmp = int(float(tmp))
+		except ValueError:
+			return True
+	if max_alpha_char is not None and\
+	len(get_alpha_char(p)) > max_alpha_char:
+		return True
+	if exclude_if_contains_alpha and contains_alpha(p):
+		return True
+	return False
+
+
+def _replace_innermost_pairs(text, replace, start, end, *filters):
+	delimiters = re.compile("[" + re.escape(start + end) + "\n]")
+	parts = []
+	opened = [] # [index in parts, contains a kept pair] for each start not closed yet
+	last = 0
+	for match in delimiters.finditer(text):
+		parts.append(text[last:match.start()])
+		last = match.end()
+		c = match.group()
+		if c == start:
+			opened.append([len(parts), False])
+			parts.append(start)
+		elif c == end and opened:
+			i, kept_inside = opened.pop()
+			# the pair is only built when nothing is kept inside: its parts are then
+			# replaced or kept for good, each character is joined at most once
+			if kept_inside or _skip_pattern("".join(parts[i:]) + end, start, end, *filters):
+				parts.append(end)
+				if opened:
+					opened[-1][1] = True
+			else:
+				del parts[i:]
+				parts.append(replace)
+		else:
+			if c == "\n":
+				# a pair is never matched across lines
+				opened = []
+			parts.append(c)
+	parts.append(text[last:])
+	return "".join(parts)
+
+
+def _replace_space_delimited(text, start, end, *filters):
+	"""
+	The text is split into the tokens between single spaces, a pattern is a token ending with end[0]
+	with a space before and after. Rounds follow the iterative version: a pattern following the
+	last one found shares its space and waits for the next round, and every str.replace of a
+	kept pattern removes its non overlapping occurrences.
 	"""
+	tokens = text.split(" ")
+	n = len(tokens)
+	prev = list(range(-1, n - 1))
+	next_ = list(range(1, n + 1))
+	candidates = [i for i in range(1, n - 1)
+		if len(tokens[i]) > 1 and tokens[i][-1] == end[0] and "\n" not in tokens[i]]
+	removed = set()
+	skipped = {}
+	occurrences = {}
+	for i in candidates:
+		if tokens[i] not in skipped:
+			skipped[tokens[i]] = _skip_pattern(" " + tokens[i] + " ", start, end, *filters)
+		occurrences.setdefault(tokens[i], []).append(i)
+
+	while True:
+		found = []
+		for i in candidates:
+			if not found or prev[i] != found[-1]:
+				found.append(i)
+		if all(skipped[tokens[i]] for i in found):
+			break
+		for i in found:
+			token = tokens[i]
+			if skipped[token]:
+				continue
+			blocked = set()
+			kept = []
+			for j in occurrences[token]:
+				if j in blocked:
+					kept.append(j)
+					continue
+				next_[prev[j]] = next_[j]
+				prev[next_[j]] = prev[j]
+				blocked.add(next_[j])
+				removed.add(j)
+			occurrences[token] = kept
+		candidates = [i for i in candidates if i not in removed]
+
+	return " ".join(t for i, t in enumerate(tokens) if i not in removed)
+
+
+def _regex_replace_pattern_iterative(text, replace, start, end, *filters):
 	pattern = rf"(\{start}.+?\{end})"
 	while True:
 		pauses = re.findall(pattern, text)
@@ -60,17 +216,7 @@ def regex_replace_pattern(text, start, end, replace="",
 			tmp_p = p[last_start:]
 			last_end = tmp_p.index(end)
 			p = tmp_p[:last_end] + end
-			if only_num:
-				tmp = p.replace(start, "").replace(end, "").replace(",", ".").replace(" ", "")
-				tmp = int(float(tmp))
-				try:
-					tmp = int(float(tmp))
-				except:
-					continue
-			if max_alpha_char is not None and\
-			len(get_alpha_char(p)) > max_alpha_char:
-				continue
-			if exclude_if_contains_alpha and contains_alpha(p):
+			if _skip_pattern(p, start, end, *filters):
 				continue
 			text = text.replace(p, replace)
 			skipped -= 1
@@ -91,13 +237,63 @@ def find_substrings(text, substrings):
 	return -1
 
 
+class SubstrReplacer(object):
+	"""
+	regex_replace_substr compiled once for a given remove_list and replace: one alternation
+	of every substring. Consecutive rules that don't interfere can be merged into a single
+	pass with SubstrReplacer.merge, each match is then replaced through a dict lookup.
+	Substitutions are repeated until none of the substrings is left, as in regex_replace_substr.
+	When every substring is a single character missing from the replacements, one pass
+	already reaches that point.
+	"""
+	def __init__(self, remove_list, replace=""):
+		self._compile([(remove_list, replace)])
+
+	@classmethod
+	def merge(cls, *rules):
+		"""
+		Args:
+			rules (list): (remove_list, replace) pairs, a substring listed twice keeps its first replace
+		Return:
+			replacer (SubstrReplacer) applying every rule in the same pass
+		"""
+		replacer = cls.__new__(cls)
+		replacer._compile(rules)
+		return replacer
+
+	def _compile(self, rules):
+		self.replacements = {}
+		for remove_list, replace in rules:
+			for s in remove_list:
+				self.replacements.setdefault(s, replace)
+		values = set(self.replacements.values())
+		self.regex = re.compile(r'|'.join(map(re.escape, self.replacements))) if self.replacements else None
+		if len(values) == 1:
+			self.replace = values.pop()
+		else:
+			self.replace = lambda match: self.replacements[match.group()]
+		self.single_pass = all(len(s) == 1 for s in self.replacements)\
+			and not any(s in v for s in self.replacements for v in self.replacements.values())
+
+	def __call__(self, text):
+		if self.regex is None:
+			return text
+		text, n = self.regex.subn(self.replace, text)
+		while n > 0 and not self.single_pass:
+			text, n = self.regex.subn(self.replace, text)
+		return text
+
+
+@functools.lru_cache(maxsize=None)
+def _get_substr_replacer(remove_list, replace):
+	return SubstrReplacer(remove_list, replace)
+
+
 def regex_replace_substr(text, remove_list, replace=""):
 	"""
 	Replace a list of substring in given string
 	"""
-	while find_substrings(text, remove_list) >= 0:
-		text = re.sub(r'|'.join(map(re.escape, remove_list)), replace, text)
-	return text
+	return _get_substr_replacer(tuple(remove_list), replace)(text)
 
 
 def replace_dict_substr(text, replace_dict):
@@ -109,6 +305,9 @@ def replace_dict_substr(text, replace_dict):
 	return text
 
 
+PUNCT_SPACING = str.maketrans({p: f" {p} " for p in "!?.,;"})
+
+
 def space_text_for_preprocess(text):
 	"""
 	Return a space formated string for preprocessing
@@ -121,9 +320,4 @@ def space_text_for_preprocess(text):
 	"""
 	text = " ".join(text.split())
 	text = " " + text + " "
-	replace_dict = {}
-	punct_list = "!?.,;"
-	for p in punct_list:
-		replace_dict[p] = f" {p} "
-	text = replace_dict_substr(text, replace_dict)
-	return text
\ No newline at end of file
+	return text.translate(PUNCT_SPACING)
\ No newline at end of file
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import soundfile as sf
+
+from src.transcript_processing.audio_backend import AudioBackend
+from src.transcript_processing.talkbank_preprocess import preprocess_data
+
+# (speaker, start_ms, end_ms), each speaker is loud on its own channel
+TURNS = [("MOT", 500, 2000), ("CHI", 2300, 3900), ("MOT", 4200, 5800), ("CHI", 6500, 8000),
+    ("MOT", 8200, 9900), ("CHI", 10400, 12100), ("MOT", 12500, 14000), ("CHI", 14600, 16300)]
+CHANNELS = {"MOT": 0, "CHI": 1}
+
+
+def write_recording(directory, sampling_rate, subtype):
+    rng = np.random.default_rng(0)
+    samples = rng.normal(0, 200, (18 * sampling_rate, 2))
+    for speaker, start, end in TURNS:
+        frames = slice(start * sampling_rate // 1000, end * sampling_rate // 1000)
+        samples[frames, CHANNELS[speaker]] = rng.normal(0, 6000, frames.stop - frames.start)
+    audio_path = os.path.join(directory, "rec.wav")
+    sf.write(audio_path, samples.astype(np.int16), sampling_rate, subtype=subtype)
+
+    lines = ["@UTF8", "@Begin", "@Languages:\teng", "@Participants:\tCHI Target_Child, MOT Mother"]
+    lines += [f"*{speaker}:\thello there . \x15{start}_{end}\x15" for speaker, start, end in TURNS]
+    lines += ["@End"]
+    transcript_path = os.path.join(directory, "rec.cha")
+    with open(transcript_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return audio_path, transcript_path
+
+
+@pytest.mark.parametrize("subtype", ["PCM_16", "PCM_24", "PCM_32"])
+def test_load_keeps_sample_width(tmp_path, subtype):
+    audio_path, _ = write_recording(str(tmp_path), 16000, subtype)
+    samples = {}
+    for backend in ("soundfile", "pydub"):
+        samples[backend], width = AudioBackend.create(backend).load(audio_path, 16000)
+        assert width == (2 if subtype == "PCM_16" else 4)
+        assert samples[backend].shape[0] == 2
+    # pydub pads negative 24 bit samples with a 0xff low byte where libsndfile pads with 0
+    difference = samples["soundfile"].astype(np.int64) - samples["pydub"]
+    assert np.abs(difference).max() <= (255 if subtype == "PCM_24" else 0)
+
+
+@pytest.mark.parametrize("sampling_rate", [16000, 44100])
+@pytest.mark.parametrize("subtype", ["PCM_16", "PCM_24"])
+def test_backends_agree_on_segments(tmp_path, sampling_rate, subtype):
+    audio_path, transcript_path = write_recording(str(tmp_path), sampling_rate, subtype)
+    segments = {}
+    for backend in ("soundfile", "pydub"):
+        output_dir = str(tmp_path / backend)
+        channels = preprocess_data("rec", audio_path, transcript_path, output_dir=output_dir, backend=backend)
+        assert channels == CHANNELS
+        segments[backend] = {speaker: pd.read_csv(os.path.join(output_dir, f"rec_{speaker}.csv"))[["start_ms", "end_ms"]]
+            for speaker in CHANNELS}
+    for speaker in CHANNELS:
+        assert len(segments["soundfile"][speaker]) == 4
+        pd.testing.assert_frame_equal(segments["soundfile"][speaker], segments["pydub"][speaker])
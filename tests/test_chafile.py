@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+pytest.importorskip("lexical_diversity")
+
+from src.transcript_processing.CHAFile import ChaFile as cf
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "data", "sample.cha")
+
+ADDRESSEES = [cf.ADDRESSEE_ALL, cf.ADDRESSEE_CHILD_DIRECTED, cf.ADDRESSEE_CHILD_PRODUCED,
+              cf.ADDRESSEE_OVER_HEARD, cf.ADDRESSEE_ADULT]
+
+
+@pytest.fixture
+def cha_files():
+    # stats() and the getters each read their own instance
+    return cf.ChaFile(SAMPLE, verbose=False), cf.ChaFile(SAMPLE, verbose=False)
+
+
+def test_stats_counts_match_count(cha_files):
+    cha, other = cha_files
+    stats = cha.stats()
+    for what in [cf.LINE_UTTERANCE, cf.LINE_VERBS, cf.LINE_NOUNS, cf.LINE_ADJECTIVES]:
+        for addressee in ADDRESSEES:
+            for countType in [cf.COUNT_TYPE_TOKENS, cf.COUNT_TYPE_TYPES]:
+                assert stats["counts"][what][addressee][countType] == other.count(what, addressee, countType)
+
+
+def test_stats_utterances_match_count_utterances_by_addressee(cha_files):
+    cha, other = cha_files
+    # the fixture has an empty utterance, skipped by both
+    assert cha.stats()["utterances"] == other.countUtterancesByAddressee()
+
+
+def test_stats_lexical_diversity_tokens_match_getter(cha_files):
+    cha, other = cha_files
+    stats = cha.stats()
+    for addressee in ADDRESSEES:
+        assert stats["lexicalDiversityTokens"][addressee] == other.getLexicalDiversityTokens(addressee)
+    assert stats["lexicalDiversityTokens"][cf.ADDRESSEE_ADULT] == []
+
+
+def test_stats_is_cached(cha_files):
+    cha, _ = cha_files
+    assert cha.stats() is cha.stats()
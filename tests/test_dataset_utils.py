@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+dataset_utils = pytest.importorskip("src.dataset_utils")
+
+
+@pytest.mark.parametrize("max_batch_size", [None, 3])
+def test_bucket_sampler_covers_every_index_once(max_batch_size):
+    durations = np.random.default_rng(0).uniform(0.5, 20, 200)
+    # one sample longer than the budget
+    durations[17] = 45
+    sampler = dataset_utils.DurationBucketSampler(durations, max_batch_seconds=40,
+                                                  max_batch_size=max_batch_size)
+    batches = list(sampler)
+    assert len(batches) == len(sampler)
+    assert sorted(i for batch in batches for i in batch) == list(range(len(durations)))
+    for batch in batches:
+        assert len(batch) == 1 or len(batch) * durations[batch].max() <= 40
+        assert max_batch_size is None or len(batch) <= max_batch_size
+
+
+def test_bucket_sampler_indices_and_shuffle():
+    durations = np.random.default_rng(1).uniform(0.5, 20, 100)
+    indices = list(range(0, 100, 3))
+    sampler = dataset_utils.DurationBucketSampler(durations, max_batch_seconds=30,
+                                                  indices=indices, shuffle=True)
+    assert sorted(i for batch in sampler for i in batch) == indices
+    assert sorted(map(tuple, sampler)) == sorted(map(tuple, sampler.batches))
@@ -0,0 +1,47 @@
+import json
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+engines = pytest.importorskip("src.engines")
+
+VOCAB = ["<pad>", "<s>", "</s>", "<unk>", "|", "A", "B", "C", "D", "E"]
+
+
+def tiny_wav2vec2_engine(tmp_path, return_attention_mask):
+    """
+    Wav2vec2Engine around a small random model, without download
+    """
+    vocab_path = tmp_path / "vocab.json"
+    vocab_path.write_text(json.dumps({token: i for i, token in enumerate(VOCAB)}))
+    tokenizer = transformers.Wav2Vec2CTCTokenizer(str(vocab_path))
+    feature_extractor = transformers.Wav2Vec2FeatureExtractor(return_attention_mask=return_attention_mask)
+    config = transformers.Wav2Vec2Config(vocab_size=len(VOCAB),
+                                         hidden_size=32,
+                                         num_hidden_layers=2,
+                                         num_attention_heads=2,
+                                         intermediate_size=64,
+                                         conv_dim=(32, 32, 32),
+                                         conv_stride=(5, 4, 4),
+                                         conv_kernel=(10, 4, 4),
+                                         num_conv_pos_embeddings=16,
+                                         num_conv_pos_embedding_groups=2,
+                                         feat_extract_norm="group",
+                                         pad_token_id=0)
+    torch.manual_seed(0)
+    engine = engines.Wav2vec2Engine.__new__(engines.Wav2vec2Engine)
+    engine.device = "cpu"
+    engine.processor = transformers.Wav2Vec2Processor(feature_extractor=feature_extractor, tokenizer=tokenizer)
+    engine.model = transformers.Wav2Vec2ForCTC(config).eval()
+    return engine
+
+
+def test_wav2vec2_batch_equals_segments(tmp_path):
+    engine = tiny_wav2vec2_engine(tmp_path, return_attention_mask=False)
+    rng = np.random.default_rng(0)
+    # mixed lengths, two of them equal
+    audios = [rng.normal(0, scale, length).astype(np.float32)
+              for scale, length in [(0.1, 4000), (0.5, 16000), (0.02, 9000), (0.3, 16000)]]
+    assert engine.process_batch(audios) == [engine.process(audio) for audio in audios]
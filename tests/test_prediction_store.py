@@ -0,0 +1,60 @@
+import os
+
+from src.prediction_store import PredictionStore, load_texts
+
+
+def test_filter_excludes_stored_ids(tmp_path):
+    with PredictionStore(str(tmp_path), "Fake") as store:
+        store.write(["a", "c"], ["text a", "text c"], language="en")
+    store = PredictionStore(str(tmp_path), "Fake")
+    assert store.filter(["a", "b", "c", "d"]) == [1, 3]
+    assert store.texts() == {"a": "text a", "c": "text c"}
+
+
+def test_torn_last_line_is_requeued(tmp_path):
+    with PredictionStore(str(tmp_path), "Fake") as store:
+        store.write(["a", "b"], ["text a", "text b"])
+    shard = store.shard_paths()[-1]
+    with open(shard, 'r', encoding="utf-8") as f:
+        content = f.read()
+    # crash in the middle of the last record
+    with open(shard, 'w', encoding="utf-8") as f:
+        f.write(content[:-10])
+
+    store = PredictionStore(str(tmp_path), "Fake")
+    assert "a" in store and "b" not in store
+    assert store.filter(["a", "b"]) == [1]
+    store.write(["b"], ["text b"])
+    store.close()
+    assert PredictionStore(str(tmp_path), "Fake").texts() == {"a": "text a", "b": "text b"}
+
+
+def test_shard_name_clash_takes_next_index(tmp_path):
+    # two runs of the same engine opened at once see the same shards
+    first = PredictionStore(str(tmp_path), "Fake")
+    second = PredictionStore(str(tmp_path), "Fake")
+    first.write(["a"], ["text a"])
+    second.write(["b"], ["text b"])
+    first.close()
+    second.close()
+    names = [os.path.basename(path) for path in first.shard_paths()]
+    assert names == ["shard-00000.jsonl", "shard-00001.jsonl"]
+    assert PredictionStore(str(tmp_path), "Fake").texts() == {"a": "text a", "b": "text b"}
+
+
+def test_shards_sorted_by_index(tmp_path):
+    store = PredictionStore(str(tmp_path), "Fake", max_records_per_shard=1)
+    for name in ["shard-99999.jsonl", "shard-100000.jsonl"]:
+        open(os.path.join(store.engine_dir, name), 'w').close()
+    store.write(["a"], ["text a"])
+    store.close()
+    names = [os.path.basename(path) for path in store.shard_paths()]
+    assert names == ["shard-99999.jsonl", "shard-100000.jsonl", "shard-100001.jsonl"]
+
+
+def test_load_texts_is_read_only(tmp_path):
+    with PredictionStore(str(tmp_path), "Fake") as store:
+        store.write(["a"], ["text a"])
+    assert load_texts(str(tmp_path), "Fake") == {"a": "text a"}
+    assert load_texts(str(tmp_path), "Missing") == {}
+    assert not os.path.exists(tmp_path / "Missing")
@@ -0,0 +1,47 @@
+import importlib
+import pickle
+import sqlite3
+
+import pytest
+
+from src.transcript_processing import RowCache, normalize_many, set_row_cache
+
+# the package re-exports the function under the module name
+ptt = importlib.import_module("src.transcript_processing.preprocess_talkbank_text")
+
+
+@pytest.fixture
+def row_cache(tmp_path):
+    cache = RowCache(path=str(tmp_path / "rows.sqlite"), flush_every=1000)
+    previous = set_row_cache(cache)
+    yield cache
+    cache.close()
+    set_row_cache(previous)
+
+
+def test_cache_is_opt_in():
+    assert ptt.ROW_CACHE is None
+
+
+def test_pool_writes_every_row(row_cache):
+    texts = [f"hello {i} &-uh" for i in range(5004)]
+    expected = normalize_many(texts, n_jobs=1, remove_tags=True)
+    row_cache.clear()
+    normalized = normalize_many(texts, n_jobs=2, chunksize=1000, remove_tags=True)
+    row_cache.close()
+    assert normalized.tolist() == expected.tolist()
+    rows = sqlite3.connect(row_cache.path).execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+    assert rows == len(texts)
+
+    # second run: every line comes from sqlite, lookups of the pool are counted here
+    row_cache.clear()
+    normalize_many(texts, n_jobs=2, chunksize=1000, remove_tags=True)
+    stats = row_cache.stats()
+    assert stats["disk_hits"] == len(texts) and stats["misses"] == 0
+
+
+def test_pickled_cache_keeps_settings_only(row_cache):
+    row_cache.set("a", (True,), "b")
+    copy = pickle.loads(pickle.dumps(row_cache))
+    assert (copy.path, copy.maxsize, copy.flush_every) == (row_cache.path, row_cache.maxsize, row_cache.flush_every)
+    assert len(copy) == 0 and copy._db is None
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from src.prediction_store import PredictionStore
+
+runner = pytest.importorskip("src.runner")
+
+
+class FakeDataset(object):
+    """
+    TalkbankDataset of n silent waveforms of lengths 1..n
+    """
+    def __init__(self, n):
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        return np.zeros(i + 1, dtype=np.float32), {"segment_id": f"s{i}"}
+
+    def ids(self, id_key='segment_id'):
+        return [f"s{i}" for i in range(self.n)]
+
+
+class FailingEngine(object):
+    """
+    Transcribes a waveform by its length, fails on the waveforms of length 4
+    """
+    def process(self, audio, language=None):
+        return self.process_batch([audio], language)[0]
+
+    def process_batch(self, audios, languages=None):
+        if any(len(audio) == 4 for audio in audios):
+            raise RuntimeError("failing sample")
+        return [str(len(audio)) for audio in audios]
+
+
+def test_failing_sample_keeps_batch_mates(tmp_path):
+    runner.run_prediction(FailingEngine(), "Fake", FakeDataset(10), "en",
+                          output_dir=str(tmp_path), batch_size=4, num_workers=0)
+    stored = PredictionStore(str(tmp_path), "Fake").texts()
+    assert sorted(stored) == [f"s{i}" for i in range(10) if i != 3]
+    assert stored["s4"] == "5"
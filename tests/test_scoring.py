@@ -0,0 +1,34 @@
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.scoring import score_table
+
+
+def test_missing_references_are_not_scored():
+    df = pd.DataFrame({"transcription": ["hello world", None, np.nan],
+                       "whisper": ["hello world", "nan", "None"],
+                       "language": ["en", "en", "en"]})
+    scores = score_table(df)
+    assert len(scores) == 1
+    assert scores["wer"].tolist() == [0.0]
+
+
+def test_normalize_options_reach_the_normalizer():
+    df = pd.DataFrame({"transcription": ["Hello World"], "whisper": ["hello world"]})
+    assert score_table(df)["wer"].tolist() == [0.0]
+    assert score_table(df, normalize_options={"lower": False})["wer"].tolist() == [1.0]
+
+
+def test_no_engine_column():
+    with pytest.raises(ValueError):
+        score_table(pd.DataFrame({"transcription": ["hello"]}))
+
+
+def test_scoring_skips_the_audio_stack():
+    code = "import sys, src.scoring; print(sorted({'pydub', 'soundfile', 'requests'} & set(sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]"
@@ -0,0 +1,119 @@
+import random
+import re
+import time
+
+import pytest
+
+from src.transcript_processing.utils_preprocess import get_alpha_char, contains_alpha,\
+    regex_replace_pattern, replace_text_after
+
+
+def reference_replace_text_after(text, after, break_chars="  !.,;" + chr(32), specific_end=None, replace=" "):
+    """
+    replace_text_after before its single scan rewrite
+    """
+    while after in text:
+        position = text.rindex(after)
+        i = position
+        while i < len(text):
+            if specific_end is not None and text[i:].startswith(specific_end):
+                break
+            elif specific_end is None and text[i] in break_chars:
+                break
+            i += 1
+        text = text[:position] + replace + text[i:]
+    return text
+
+
+def reference_regex_replace_pattern(text, start, end, replace="",
+                                    exclude_if_contains_alpha=False, max_alpha_char=None):
+    """
+    regex_replace_pattern before its single scan rewrite (without only_num)
+    """
+    pattern = rf"(\{start}.+?\{end})"
+    while True:
+        pauses = re.findall(pattern, text)
+        if len(pauses) == 0:
+            break
+        skipped = 0
+        for p in pauses:
+            skipped += 1
+            # remove the smallest one
+            last_end = p.index(end)
+            tmp_p = p[:last_end + 1]
+            last_start = tmp_p.rindex(start)
+            tmp_p = p[last_start:]
+            last_end = tmp_p.index(end)
+            p = tmp_p[:last_end] + end
+            if max_alpha_char is not None and len(get_alpha_char(p)) > max_alpha_char:
+                continue
+            if exclude_if_contains_alpha and contains_alpha(p):
+                continue
+            text = text.replace(p, replace)
+            skipped -= 1
+        if skipped == len(pauses):
+            break
+    return text
+
+
+# calls made by preprocess_row, and variants taking the fallback paths
+PATTERNS = [
+    ("(", ")", dict(replace=" ✦pause✦ ", exclude_if_contains_alpha=True)),
+    ("[", "]", dict(replace=" ✦bracket✦ ")),
+    (" ", "- ", dict(replace=" ", max_alpha_char=2)),
+    (" ", "- ", dict(replace=" ", exclude_if_contains_alpha=True)),
+    ("[", "]", dict(replace="", max_alpha_char=1)),
+    (" ", "- ", dict(replace="", max_alpha_char=2)),
+]
+MARKERS = [
+    ("&=", dict(replace=" ✦event✦ ")),
+    ("&*", dict(replace=" ✦interposed word✦ ")),
+    ("&+", {}),
+    ("&-", dict(replace="")),
+    ("&{l=*", dict(specific_end="&}l=*")),
+    ("&{l=*", dict(specific_end="&}l=*", replace="ab")),
+    ("&+", dict(replace="x.y")),
+]
+ATOMS = ["a", "bc", "abc", "0.5", "1,2", " ", " ", "  ", "(", ")", "[", "]", "-", "- ", "x-", "ab-", "abc-", "é-",
+         "&=", "&*", "&+", "&-", "&{l=*", "&}l=*", "&", "=", ".", ",", "!", ";", "\n", "\t", "✦", "l", "*", "{", "}"]
+
+
+@pytest.mark.parametrize("text", [
+    # nested
+    "a ((0.5) (b)) ((1)) c", "[x [y [z]] w]", "((((((1))))))", " ab- (cd- e-) ",
+    # overlapping
+    "(0.5)(0.5)(", " j- i- me- ", " a- a- a- b- ", "[a][b]]][",
+    # unterminated
+    "(0.5", "((0.5)", "a ]", " abc-", "[[", "(\n0.5)",
+])
+@pytest.mark.parametrize("start, end, kwargs", PATTERNS)
+def test_regex_replace_pattern_cases(text, start, end, kwargs):
+    assert regex_replace_pattern(text, start, end, **kwargs) == reference_regex_replace_pattern(text, start, end, **kwargs)
+
+
+@pytest.mark.parametrize("text", [
+    # nested and overlapping
+    "&=laughs&=coughs .", "a &+fr&+fr b", "&=&=&=", "&{l=*LAUGH a &{l=*X b &}l=* c &}l=* d",
+    # unterminated
+    "&=laughs", "&{l=*LAUGH no end", "x &-", "&}l=* &{l=*",
+])
+@pytest.mark.parametrize("after, kwargs", MARKERS)
+def test_replace_text_after_cases(text, after, kwargs):
+    assert replace_text_after(text, after, **kwargs) == reference_replace_text_after(text, after, **kwargs)
+
+
+def test_random_texts():
+    rng = random.Random(0)
+    for _ in range(5000):
+        text = "".join(rng.choice(ATOMS) for _ in range(rng.randint(0, 25)))
+        start, end, kwargs = rng.choice(PATTERNS)
+        assert regex_replace_pattern(text, start, end, **kwargs) == reference_regex_replace_pattern(text, start, end, **kwargs), repr(text)
+        after, kwargs = rng.choice(MARKERS)
+        assert replace_text_after(text, after, **kwargs) == reference_replace_text_after(text, after, **kwargs), repr(text)
+
+
+def test_deep_nesting_is_linear():
+    text = "(" * 64000 + "a" + ")" * 64000
+    start = time.perf_counter()
+    assert regex_replace_pattern(text, "(", ")", replace=" ✦pause✦ ", exclude_if_contains_alpha=True) == text
+    assert time.perf_counter() - start < 2